@@ -1,39 +1,183 @@
 from .useful_stuff import *
 import numpy as np
 from typing import Literal
-import SimpleITK as sitk
 import os
-from skimage.transform import rotate
+from .volumes import *
+from .profiling import profiled
+from collections import OrderedDict
+from threading import RLock
+
+class SliceCache(OrderedDict):
+  def __init__(self, maxsize = 64):
+    super().__init__()
+    self.maxsize = maxsize
+    self.lock = RLock()
+
+  def __getitem__(self, key):
+    with self.lock:
+      value = super().__getitem__(key)
+      self.move_to_end(key)
+      return value
+
+  def __setitem__(self, key, value):
+    with self.lock:
+      super().__setitem__(key, value)
+      self.move_to_end(key)
+      while len(self) > self.maxsize: self.popitem(last = False)
+
+def arrays_in(value):
+  # Every numpy array in value, looking inside lists, tuples and dictionaries
+  if isinstance(value, np.ndarray): yield value
+  elif isinstance(value, dict):
+    for item in value.values(): yield from arrays_in(item)
+  elif isinstance(value, (list, tuple)):
+    for item in value: yield from arrays_in(item)
+
+def footprint(arrays):
+  # Bytes held by some arrays, counting each buffer once however many views of it there are
+  buffers = dict()
+  for array in arrays:
+    while isinstance(array.base, np.ndarray): array = array.base
+    buffers[id(array)] = array.nbytes
+  return sum(buffers.values())
 
 class Array3D():
-  def __init__(self, data):
+  def __init__(self, data, cache_size = 64, lazy = True):
+    self.cache = SliceCache(cache_size)
+    self.extents = dict()
+    self.pyramid = dict()
+    self.lazy = lazy
     self.data = self.read_data_source(data)
 
+  @property
+  def array(self):
+    # Lazily opened files are only read the first time their voxels are needed
+    if self._array is None:
+      if self.file is not None: self.array = open_volume(self.file)
+      elif self.source is not None: self.array = self.source.array
+    return self._array
+
+  @array.setter
+  def array(self, array):
+    # Anything cached was derived from the old array
+    self._array = self.compact(array)
+    self.cache.clear()
+    self.extents = dict()
+    self.pyramid = dict()
+
+  def compact(self, array):
+    # Subclasses choose how their data is stored, the raw data is kept as it is
+    return array
+
+  def downsample(self, array):
+    # Intensities are averaged over each 2x2x2 block, with odd edges repeated so no voxels are dropped
+    array = np.pad(array, [(0, n % 2) for n in array.shape], mode = 'edge')
+    return array.reshape(array.shape[0]//2, 2, array.shape[1]//2, 2, array.shape[2]//2, 2).mean((1, 3, 5), dtype = np.float32)
+
+  @profiled
+  def get_level(self, level = 0):
+    # Level n of the pyramid halves every axis n times, and is only built the first time it's needed
+    if level == 0: return self.array
+    if level not in self.pyramid: self.pyramid[level] = self.downsample(self.get_level(level-1))
+    return self.pyramid[level]
+
+  @property
+  def shape(self):
+    return self.header['shape'] if self._array is None else self._array.shape
+
+  @profiled
   def read_data_source(self, data):
     self.isNone = False
-    if type(data) is type(None): 
-      data = np.zeros((256, 256, 256)).astype(int)
-      self.isNone = True
-    elif type(data) is np.ndarray:
+    self.file, self.source, self._array = None, None, None
+    self.header = {'shape' : None, 'dtype' : None, 'spacing' : (1., 1., 1.)}
+    if type(data) is type(None): self.isNone = True
+    elif isinstance(data, Array3D):
+      # Shares the other volume's array rather than reading it again
+      self.source, self.header = data, data.header
+      if not self.lazy: self.load()
+    elif isinstance(data, np.ndarray):
       if len(data.shape) == 3: self.array = data
       else: raise TypeError(f'Input data must be 3D - current shape = {data.shape}')
     elif type(data) is str:
       if not os.path.isfile(data): raise Exception(f'{data} not found')
-      if data[-4:] == '.nii': self.array = sitk.GetArrayFromImage(sitk.ReadImage(data))
-      elif data[-4:] == '.npy': self.array = np.load(data)
-    else: raise TypeError(f'Input data must be path to .nii or .npy, or an array, not {data}')
-
-  def get_slice(self, view : Literal['Saggittal', 'Axial', 'Coronal'], slice):
-    if view == 'Saggittal': picture = rotate(self.array[:,:,255-slice], 270, preserve_range=True, order = 0)
-    elif view == 'Axial': picture = np.flip(self.array[:,slice,:])
-    else: picture = np.flip(self.array[slice,:,:], 1)
+      if data[-4:] not in ['.nii', '.npy'] and data[-7:] != '.nii.gz': raise TypeError(f'Input data must be path to .nii, .nii.gz or .npy, or an array, not {data}')
+      self.file = data
+      self.header = read_header(data)
+      if not self.lazy: self.load()
+    else: raise TypeError(f'Input data must be path to .nii or .npy, an array, or another Array3D, not {data}')
+
+  def load(self):
+    self.array
+    return self
+
+  def buffers(self):
+    # The arrays this volume is holding on to - its data, pyramid and anything cached from them
+    with self.cache.lock: cached = list(dict.values(self.cache))
+    return list(arrays_in([self._array, self.pyramid, cached, self.extents]))
+
+  def get_slice(self, view : Literal['Saggittal', 'Axial', 'Coronal'], slice, level = 0, crop = None):
+    key = (view, slice) if level == 0 else (view, slice, level)
+    try: picture = self.cache[key]
+    except KeyError: picture = self.cache[key] = self.read_slice(view, slice, level)
+    return picture if crop is None else picture[self.level_crop(crop, level)]
+
+  @profiled
+  def read_slice(self, view : Literal['Saggittal', 'Axial', 'Coronal'], slice, level = 0):
+    # Views into the array rather than copies - the reorientation is only ever a rotation by a multiple of 90 degrees
+    # Slices are always numbered at full resolution, coarser levels use the slice that voxel falls in
+    array = self.get_level(level)
+    index = self.to_slice(view, slice) >> level
+    if view == 'Saggittal': picture = np.rot90(array[:,:,index], -1)
+    elif view == 'Axial': picture = array[::-1,index,::-1]
+    else: picture = array[index,:,::-1]
     return picture
+
+  def slice_shape(self, view : Literal['Saggittal', 'Axial', 'Coronal']):
+    return {'Saggittal' : (self.shape[1], self.shape[0]), 'Axial' : (self.shape[0], self.shape[2])}.get(view, (self.shape[1], self.shape[2]))
+
+  def auto_level(self, view : Literal['Saggittal', 'Axial', 'Coronal'], level, ax, dpi = None, crop = None):
+    # 'auto' picks the coarsest level that still has a voxel for every pixel of the axis, at the dpi it will end up drawn at
+    # Only the Viewer refines, drawing coarser while the slider moves - the static methods draw level 0 unless given 'auto' or a level
+    if level != 'auto': return level
+    pixels = min(ax.bbox.width, ax.bbox.height) * (1 if dpi is None else dpi/ax.figure.dpi)
+    if pixels <= 0: return 0
+    shape = self.slice_shape(view) if crop is None else (crop[1]-crop[0], crop[3]-crop[2])
+    return int(max(0, min(np.log2(min(shape)/pixels), np.log2(min(self.shape)))))
+
+  def level_crop(self, crop, level = 0):
+    # crop is (first row, last row + 1, first column, last column + 1) of a slice at full resolution, widened to whole voxels of the level
+    return slice(crop[0] >> level, -(-crop[1] >> level)), slice(crop[2] >> level, -(-crop[3] >> level))
+
+  def crop_origin(self, crop, level = 0):
+    # Full resolution row and column of the first voxel of a cropped slice
+    return (0, 0) if crop is None else ((crop[0] >> level) << level, (crop[2] >> level) << level)
+
+  def level_extent(self, picture, level = 0, crop = None):
+    # Where a slice of some level sits in full resolution pixels, so everything drawn over it lines up whatever the level
+    row, column = self.crop_origin(crop, level)
+    return (column-0.5, column+picture.shape[1]*2**level-0.5, row+picture.shape[0]*2**level-0.5, row-0.5)
+
+  def level_coords(self, coords, level = 0, start = 0):
+    return coords + start if level == 0 else coords*2**level + (2**level-1)/2 + start
   
+  def view_axis(self, view : Literal['Saggittal', 'Axial', 'Coronal']):
+    return {'Saggittal' : 2, 'Axial' : 1}.get(view, 0)
+
+  def to_slice(self, view : Literal['Saggittal', 'Axial', 'Coronal'], index):
+    # Sagittal slices count from the far end of the array
+    return self.shape[2]-1-index if view == 'Saggittal' else index
+
+  @profiled
+  def get_extent(self, view : Literal['Saggittal', 'Axial', 'Coronal']):
+    # First and last non-empty slice of a view, from one projection of the volume that's kept for next time
+    if view not in self.extents:
+      axis = self.view_axis(view)
+      occupied = np.flatnonzero(np.any(self.array, axis = tuple(i for i in range(3) if i != axis)))
+      if len(occupied) == 0: raise Exception('Volume is empty')
+      self.extents[view] = tuple(sorted([self.to_slice(view, occupied[0]), self.to_slice(view, occupied[-1])]))
+    return self.extents[view]
+
   def get_slices(self, view : Literal['Saggittal', 'Axial', 'Coronal'], slices, buffer):
-    i = 0
-    while not np.any(self.get_slice(view, i)): i += 1
-    start = i
-    i = 255
-    while not np.any(self.get_slice(view, i)): i -= 1
-    slices = np.linspace(start+buffer[0], i-buffer[1], slices).astype(int)
+    start, end = self.get_extent(view)
+    slices = np.linspace(start+buffer[0], end-buffer[1], slices).astype(int)
     return slices
@@ -0,0 +1,139 @@
+from .Image import *
+from .lazy import lazy_import
+from .volumes import open_volume
+from .profiling import profiled
+import numpy as np
+
+find_objects = lazy_import('scipy.ndimage', 'find_objects')
+
+class Atlas():
+  # Voxel-wise statistics over a cohort, built one subject at a time so only the running totals are ever kept
+  # Subjects must already be registered to the same space, as every array is compared voxel for voxel
+  def __init__(self, shape = None, labels = None, slab = 16):
+    self.shape = None if shape is None else tuple(shape)
+    self.labels = None if labels is None else set(labels)
+    self.slab = slab
+    self.n = 0
+    self.mean, self.m2 = None, None
+    # label -> (first corner, counts) - every label is only counted inside the box it has ever appeared in
+    self.counts = dict()
+    self.n_seg = 0
+    self.count_dtype = np.uint8
+
+  def check_shape(self, shape):
+    if self.shape is None: self.shape = tuple(shape)
+    elif tuple(shape) != self.shape: raise Exception(f'All subjects must have the same shape, {self.shape} - not {tuple(shape)}. Register them to a template first')
+
+  @profiled
+  def add(self, image = None, seg = None, mask = False, centre = None):
+    # Either can be an Array3D, an array or a path to a .nii or .npy file
+    # With mask, image only counts inside seg and is centre (or 0) everywhere else - a masked Image is always masked this way
+    if seg is not None and not isinstance(seg, np.ndarray): seg = seg.array if isinstance(seg, Array3D) else Segmentation(seg, lazy = False).array
+    if mask and seg is None: raise Exception('A segmentation is needed to mask the image')
+    if image is not None: self.add_image(image, seg if mask else None, centre)
+    if seg is not None: self.add_seg(seg)
+    return self
+
+  def add_image(self, image, mask = None, centre = None):
+    if isinstance(image, Image): read = image.masked_array
+    else:
+      array = image.array if isinstance(image, Array3D) else open_volume(image) if type(image) is str else image
+      read = lambda part: array[part] if mask is None else np.where(mask[part] != 0, array[part], 0 if centre is None else centre)
+    self.check_shape(image.shape if isinstance(image, Array3D) else array.shape)
+    if self.mean is None: self.mean, self.m2 = np.zeros(self.shape), np.zeros(self.shape)
+    self.n += 1
+    # Welford's update, a slab of slices at a time so the temporaries (and any masking) stay small
+    for start in range(0, self.shape[0], self.slab):
+      part = slice(start, start + self.slab)
+      x = np.array(read(part), dtype = np.float64)
+      delta = x - self.mean[part]
+      self.mean[part] += delta / self.n
+      x -= self.mean[part]
+      x *= delta
+      self.m2[part] += x
+
+  def add_seg(self, seg):
+    array = seg if isinstance(seg, np.ndarray) else seg.array if isinstance(seg, Array3D) else Segmentation(seg, lazy = False).array
+    self.check_shape(array.shape)
+    self.n_seg += 1
+    # Counts are kept in the smallest type that can hold the number of subjects, starting at uint8
+    if self.n_seg in [2**8, 2**16]:
+      self.count_dtype = np.uint16 if self.n_seg == 2**8 else np.uint32
+      self.counts = {label : (corner, counts.astype(self.count_dtype)) for label, (corner, counts) in self.counts.items()}
+    for label, box in enumerate(find_objects(array), 1):
+      if box is None or (self.labels is not None and label not in self.labels): continue
+      corner, counts = self.grow(label, box)
+      counts[tuple(slice(s.start - c, s.stop - c) for s, c in zip(box, corner))] += array[box] == label
+
+  def grow(self, label, box):
+    # Makes the label's counts cover box as well as everywhere it's been seen before
+    start, stop = np.array([s.start for s in box]), np.array([s.stop for s in box])
+    if label in self.counts:
+      corner, counts = self.counts[label]
+      end = corner + counts.shape
+      if np.all(start >= corner) and np.all(stop <= end): return corner, counts
+      start, stop = np.minimum(start, corner), np.maximum(stop, end)
+      grown = np.zeros(stop - start, dtype = counts.dtype)
+      grown[tuple(slice(c - s, e - s) for c, e, s in zip(corner, end, start))] = counts
+    else: grown = np.zeros(stop - start, dtype = self.count_dtype)
+    self.counts[label] = (start, grown)
+    return self.counts[label]
+
+  @classmethod
+  def from_database(cls, database, key = 'scan', ids = None, labels = None, slab = 16, depth = 2, workers = 2):
+    # Only the files the atlas needs are read, the next depth subjects in the background - no Image or Scan is made and nothing is kept in the database
+    # brain is the scan masked by the segmentation, as in Scan
+    seg_key = 'seg' if 'seg' in database.kf else 'segmentation' if 'segmentation' in database.kf else None
+    mask = key == 'brain' and key not in database.kf
+    file_key = 'scan' if mask else key
+    if file_key is not None and file_key not in database.kf: raise Exception(f'{key} is not one of the Database\'s keys - {list(database.kf)}')
+    if mask and seg_key is None: raise Exception('No segmentations labelled in Database to mask the scans with')
+    def read(id):
+      image = None if file_key is None else open_volume(database.find_file(database.kf[file_key], id))
+      seg = None if seg_key is None else Segmentation(database.find_file(database.kf[seg_key], id), lazy = False).array
+      return image, seg
+    atlas = cls(labels = labels, slab = slab)
+    for id, arrays, error in database.prefetch(ids, depth, workers, read = read):
+      if error is not None:
+        print(f'Warning : {id} left out of the atlas - {error}')
+        continue
+      atlas.add(*arrays, mask = mask)
+    return atlas
+
+  def get_variance(self, ddof = 1):
+    if self.n <= ddof: raise Exception(f'Variance needs more than {ddof} subjects')
+    return self.m2 / (self.n - ddof)
+
+  def get_probability(self, label):
+    # Fraction of subjects with label at each voxel
+    if type(label) is str: label = rlut[label]
+    probability = np.zeros(self.shape, dtype = np.float32)
+    if label in self.counts:
+      corner, counts = self.counts[label]
+      probability[tuple(slice(c, c + n) for c, n in zip(corner, counts.shape))] = counts / self.n_seg
+    return probability
+
+  def get_labels(self, threshold = 0.5):
+    # Most common label at each voxel, or 0 where no label is in at least threshold of subjects
+    best, labels = np.zeros(self.shape, dtype = np.float32), np.zeros(self.shape, dtype = np.uint16)
+    for label, (corner, counts) in self.counts.items():
+      box = tuple(slice(c, c + n) for c, n in zip(corner, counts.shape))
+      probability = counts / self.n_seg
+      better = (probability > best[box]) & (probability >= threshold)
+      best[box][better], labels[box][better] = probability[better], label
+    return labels
+
+  def segmentation(self, threshold = 0.5) -> Segmentation:
+    return Segmentation(self.get_labels(threshold))
+
+  def image(self, key = 'mean', threshold = 0.5, cmap = 'inferno') -> Image:
+    # The mean, standard deviation or variance as an Image, drawn over the cohort's most common labels
+    if key == 'mean': array = self.mean
+    elif key == 'variance': array = self.get_variance()
+    elif key == 'std': array = np.sqrt(self.get_variance())
+    else: raise Exception(f'key must be mean, std or variance, not {key}')
+    if array is None: raise Exception('No images have been added to the atlas')
+    return Image(key, array.astype(np.float32), self.segmentation(threshold) if len(self.counts) > 0 else Segmentation(None), id = 'atlas', cmap = cmap)
+
+  def probability(self, label, threshold = 0.5, cmap = 'inferno') -> Image:
+    return Image(label if type(label) is str else lut.get(label, str(label)), self.get_probability(label), self.segmentation(threshold), id = 'atlas', cmap = cmap)
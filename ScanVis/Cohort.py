@@ -0,0 +1,122 @@
+import numpy as np
+from .useful_stuff import *
+from .Volumetrics import Volumetrics
+
+aggregates = ['mean', 'sum', 'count', 'std', 'min', 'max', 'median']
+
+class Cohort():
+  # One row per subject - every label's volume in cm³ as a column, with age in months and gender from the patient table
+  # Built once from Volumetrics, then saved, so questions about the cohort never open a scan again
+  def __init__(self, source, patients = None, processes = None):
+    # source is a saved Cohort, or anything Volumetrics takes - a Database, seg files or saved Volumetrics
+    saved = False
+    if type(source) is str and source[-4:] == '.npz':
+      with np.load(source) as data: saved = 'age' in data.files
+    if saved: self.load(source)
+    else:
+      if not isinstance(source, Volumetrics): source = Volumetrics(source, processes = processes)
+      self.join(source, patient_dict if patients is None else patients)
+
+  def join(self, volumetrics : Volumetrics, patients):
+    # Subjects missing from the patient table get an age of -1 and gender 'U'
+    self.ids, self.labels = np.asarray(volumetrics.ids, dtype = str), np.asarray(volumetrics.labels)
+    self.volumes = volumetrics.volumes.astype(np.float32)
+    rows = [patients.get(id, [-1, 'U']) for id in self.ids]
+    self.age = np.array([age for age, gender in rows], dtype = np.int16)
+    self.gender = np.array([gender for age, gender in rows], dtype = 'U1')
+    self.index = {id : i for i, id in enumerate(self.ids)}
+
+  def save(self, file):
+    np.savez(file, ids = self.ids, labels = self.labels, volumes = self.volumes, age = self.age, gender = self.gender)
+
+  def load(self, file):
+    with np.load(file) as data:
+      self.ids, self.labels, self.volumes = data['ids'], data['labels'], data['volumes']
+      self.age, self.gender = data['age'], data['gender']
+    self.index = {id : i for i, id in enumerate(self.ids)}
+
+  @property
+  def years(self): return self.age / 12
+
+  @property
+  def total_volume(self): return self.volumes[:, self.labels != 0].sum(1)
+
+  def column(self, name):
+    # A label (by number or FreeSurfer name), or age, years, gender, total_volume or id
+    if type(name) is str and name in ['age', 'years', 'gender', 'total_volume']: return getattr(self, name)
+    if type(name) is str and name == 'id': return self.ids
+    label = rlut[name] if type(name) is str else name
+    index = np.searchsorted(self.labels, label)
+    if index == len(self.labels) or self.labels[index] != label: return np.zeros(len(self.ids), np.float32)
+    return self.volumes[:, index]
+
+  def __getitem__(self, name): return self.column(name)
+
+  def __len__(self): return len(self.ids)
+
+  def rows(self, rows):
+    # A new Cohort of some of the subjects, by boolean mask or row numbers, sharing nothing with this one
+    cohort = Cohort.__new__(Cohort)
+    cohort.ids, cohort.labels, cohort.volumes = self.ids[rows], self.labels, self.volumes[rows]
+    cohort.age, cohort.gender = self.age[rows], self.gender[rows]
+    cohort.index = {id : i for i, id in enumerate(cohort.ids)}
+    return cohort
+
+  def select(self, ids):
+    if type(ids) is str: ids = [ids]
+    return self.rows(np.array([self.index[id] for id in ids], dtype = int))
+
+  def mask(self, **conditions):
+    # column = value, column = [values] for any of them, or column = (low, high) for low <= value < high, either end None for no limit
+    keep = np.ones(len(self.ids), bool)
+    for name, condition in conditions.items():
+      values = self.column(name)
+      if type(condition) is tuple:
+        if condition[0] is not None: keep &= values >= condition[0]
+        if condition[1] is not None: keep &= values < condition[1]
+      elif type(condition) in [list, np.ndarray]: keep &= np.isin(values, condition)
+      else: keep &= values == condition
+    return keep
+
+  def filter(self, mask = None, **conditions):
+    # e.g. cohort.filter(gender = 'F', years = (8, 10))['Left-Hippocampus'].mean()
+    keep = self.mask(**conditions)
+    if mask is not None: keep &= mask
+    return self.rows(keep)
+
+  def group(self, by, name, aggregate = 'mean', bins = None):
+    # aggregate of column name for each value of column by, or each of bins if by is continuous, e.g. group('years', 17, bins = [4, 8, 12])
+    # Returns (groups, results), where a bin is labelled by its lower edge and subjects outside the bins are left out - by = None is one group of everyone
+    if aggregate not in aggregates: raise Exception(f'aggregate must be one of {aggregates}, not {aggregate}')
+    keys, values = np.zeros(len(self.ids)) if by is None else self.column(by), self.column(name).astype(np.float64)
+    if bins is not None:
+      bins = np.asarray(bins)
+      inside = (keys >= bins[0]) & (keys < bins[-1])
+      keys, values = bins[np.digitize(keys[inside], bins) - 1], values[inside]
+    groups, inverse = np.unique(keys, return_inverse = True)
+    counts = np.bincount(inverse, minlength = len(groups))
+    if aggregate == 'count' or len(groups) == 0: return groups, counts
+    sums = np.bincount(inverse, values, len(groups))
+    if aggregate == 'sum': return groups, sums
+    if aggregate == 'mean': return groups, sums / counts
+    if aggregate == 'std':
+      squares = np.bincount(inverse, values**2, len(groups))
+      with np.errstate(invalid = 'ignore', divide = 'ignore'): return groups, np.sqrt(np.maximum(squares - sums**2 / counts, 0) / (counts - 1))
+    if aggregate in ['min', 'max']:
+      results = np.full(len(groups), np.inf if aggregate == 'min' else -np.inf)
+      (np.minimum if aggregate == 'min' else np.maximum).at(results, inverse, values)
+      return groups, results
+    # Median - sorted by group then value, so each group is a run and its middle can be read off directly
+    order = np.lexsort((values, inverse))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return groups, (values[order][starts + (counts - 1) // 2] + values[order][starts + counts // 2]) / 2
+
+  def aggregate(self, name, aggregate = 'mean'):
+    groups, results = self.group(None, name, aggregate)
+    return results[0] if len(groups) > 0 else np.nan
+
+  def table(self):
+    table = np.zeros(len(self.ids), dtype = [('id', self.ids.dtype), ('age', np.int16), ('gender', 'U1'), ('total_volume', float), ('volumes', np.float32, (len(self.labels),))])
+    table['id'], table['age'], table['gender'] = self.ids, self.age, self.gender
+    table['total_volume'], table['volumes'] = self.total_volume, self.volumes
+    return table
@@ -1,13 +1,87 @@
 from .Images import *
 from .Scan import *
 from .Segmentation import *
+from .Atlas import Atlas
+from .profiling import profiled
 import numpy as np
+import os
+import json
+import hashlib
+import threading
+from bisect import bisect_left
 from os import listdir
 from os.path import join, split, isdir, isfile
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from .overlap import compare_files
 from collections.abc import MutableMapping
 
+def index_path(folders):
+  # Indexes live in the cache folder, one per set of folders, so nothing is ever written next to the data
+  name = hashlib.md5(json.dumps([os.path.abspath(folder) for folder in folders]).encode()).hexdigest()
+  return join(cache_folder, 'indexes', f'{name}.json')
+
+class DatabaseIndex():
+  # Maps subject ID -> file for every folder of a Database, saved in the cache folder so folders are only listed again when they change
+  def __init__(self, folders, path = None):
+    self.folders = list(folders)
+    self.path = index_path(self.folders) if path is None else path
+    self.entries = dict()
+    self.load()
+    self.refresh()
+
+  def load(self):
+    try:
+      with open(self.path, 'r') as file: self.entries = json.load(file)
+    except (OSError, ValueError): self.entries = dict()
+
+  def save(self):
+    # Written to a temporary file and moved into place, so another process never reads half an index
+    try:
+      os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok = True)
+      temporary = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+      with open(temporary, 'w') as file: json.dump(self.entries, file)
+      os.replace(temporary, self.path)
+    except OSError: pass
+
+  @profiled
+  def refresh(self):
+    changed = False
+    for folder in self.folders:
+      mtime = os.stat(folder).st_mtime_ns
+      entry = self.entries.get(folder)
+      if entry is not None and entry['mtime'] == mtime: continue
+      files = dict()
+      for file in sorted(listdir(folder)):
+        if file[0] != '.': files.setdefault(file[:file.find('.')], file)
+      self.entries[folder] = {'mtime' : mtime, 'files' : files}
+      changed = True
+    self.ids = set(self.entries[self.folders[0]]['files'])
+    for folder in self.folders[1:]: self.ids = self.ids.intersection(self.entries[folder]['files'])
+    self.ids = sorted(self.ids)
+    if changed: self.save()
+    return changed
+
+  def find(self, folder, id):
+    file = self.entries[folder]['files'].get(id)
+    return None if file is None else join(folder, file)
+
+  def search(self, id):
+    # Exact match, then every ID starting with id, then every ID containing it
+    start = bisect_left(self.ids, id)
+    if start < len(self.ids) and self.ids[start] == id: return [id]
+    options = self.ids[start:bisect_left(self.ids, id + '\U0010ffff')]
+    if len(options) == 0: options = [file for file in self.ids if id in file]
+    return options
+
+def open_subject(files, id):
+  # A subject from its files, key -> path, built the same way Database builds it - so other processes can open it without reading the index
+  seg_key = 'seg' if 'seg' in files else 'segmentation' if 'segmentation' in files else None
+  if 'scan' in files and seg_key is not None: return Scan(files['scan'], files[seg_key], id)
+  return Images([Image(key, file) for key, file in files.items() if key != seg_key], id, None if seg_key is None else Segmentation(files[seg_key]))
+
 class Database(MutableMapping):
-  def __init__(self, keys = None, folders = None, kf : dict = None):
+  def __init__(self, keys = None, folders = None, kf : dict = None, index_file = None, memory_limit = 2**32):
     if (keys is None or folders is None) and (kf is None): raise TypeError('Either kf, or keys AND folders, must be specified')
     if kf is None:
       if type(keys) in [list, np.ndarray]: keys = [keys]
@@ -17,6 +91,12 @@ class Database(MutableMapping):
       for key, folder in zip(keys, folders): kf[key] = folder
 
     self.kf = kf
+    self.index_file = index_file
+    # Subjects loaded through attributes are kept, least recently used first, until they hold more than memory_limit bytes
+    self.memory_limit = memory_limit
+    self.recent = OrderedDict()
+    self.pinned = set()
+    self.hits, self.misses, self.evictions = 0, 0, 0
     self.validate_folders()
 
   def validate_folders(self):
@@ -29,24 +109,78 @@ class Database(MutableMapping):
     self.trim_excess()
 
   def trim_excess(self):
-    self.files = set([file[:file.find('.')] for file in listdir(list(self.kf.values())[0]) if file[0] != '.'])
-    for folder in list(self.kf.values())[1:]:
-      files = set([file[:file.find('.')] for file in listdir(folder) if file[0] != '.'])
-      self.files = self.files.intersection(files)
-    self.files = sorted(list(self.files))
-    self.dictionary = dict(zip(files, [None]*len(files)))
+    self.index = DatabaseIndex(self.kf.values(), self.index_file)
+    self.files = self.index.ids
+    self.dictionary = dict(zip(self.files, [None]*len(self.files)))
+
+  @profiled
+  def refresh(self):
+    # Picks up subjects added or removed since the Database was made, keeping any already loaded
+    if self.index.refresh():
+      self.files = self.index.ids
+      self.dictionary = {file : self.dictionary.get(file) for file in self.files}
+      self.recent = OrderedDict((id, True) for id in self.recent if id in self.dictionary)
+      self.pinned = self.pinned.intersection(self.dictionary)
 
   def find_file(self, folder, id):
-    for file in listdir(folder): 
-      if id in file: return join(folder, file)
+    return self.index.find(folder, id)
+
+  def subject_files(self, id):
+    files = {key : self.find_file(folder, id) for key, folder in self.kf.items()}
+    if None in files.values(): raise Exception(f'{id} is not in the Database')
+    return files
+
+  def fetch(self, id, load = True):
+    subject = self.__call__(id)
+    return subject.load() if load else subject
+
+  def prefetch(self, ids = None, depth = 4, workers = 2, load = True, read = None):
+    # Yields (id, subject, error) in order while the next depth subjects are read in the background - SimpleITK lets go of the GIL while it reads
+    # A subject that fails to load comes back as None with its exception, and iterating carries on
+    # read(id) replaces building the whole subject, for loops that only need some of its files
+    ids = list(self.files if ids is None else ids)
+    if read is None: read = lambda id: self.fetch(id, load)
+    pending = deque()
+    with ThreadPoolExecutor(max(1, workers)) as pool:
+      try:
+        for i in range(len(ids)):
+          while len(pending) <= depth and i + len(pending) < len(ids): pending.append(pool.submit(read, ids[i + len(pending)]))
+          future = pending.popleft()
+          try: yield ids[i], future.result(), None
+          except Exception as error: yield ids[i], None, error
+      finally:
+        # Stopping early shouldn't mean waiting for subjects nobody will look at
+        for future in pending: future.cancel()
+
+  def seg_folder(self):
+    if 'seg' not in self.kf and 'segmentation' not in self.kf: raise Exception('No segmentations labelled in Database')
+    return self.kf['seg' if 'seg' in self.kf else 'segmentation']
+
+  def compare(self, other, ids = None, structure_id = None, surface = True, processes = None):
+    # Overlap of every label between the segmentations of each subject in both databases, one subject per process
+    # Returns id -> overlap table, subjects that fail are reported and left out
+    ids = [id for id in (self.files if ids is None else ids) if id in other.dictionary]
+    if structure_id is not None and type(structure_id) not in [list, np.ndarray]: structure_id = [structure_id]
+    tables = dict()
+    with ProcessPoolExecutor(processes) as pool:
+      futures = [pool.submit(compare_files, self.find_file(self.seg_folder(), id), other.find_file(other.seg_folder(), id), structure_id, surface) for id in ids]
+      for id, future in zip(ids, futures):
+        try: tables[id] = future.result()
+        except Exception as error: print(f'Warning : {id} could not be compared - {error}')
+    return tables
+
+  def atlas(self, key = 'scan', ids = None, labels = None, depth = 2, workers = 2) -> Atlas:
+    # Mean and variance of key, and how often each label is at each voxel, over every subject without keeping any loaded
+    return Atlas.from_database(self, key, ids, labels, depth = depth, workers = workers)
 
   def __call__(self, id):
     if ('scan' in self.kf) and ('seg' in self.kf or 'segmentation' in self.kf):
       return self.scan(id)
     return self.image(id)
 
+  @profiled
   def image(self, id) -> Image:
-    options = [file for file in self.files if id in file]
+    options = self.index.search(id)
     if len(options) == 0: raise Exception(f'No data with that ID')
     elif len(options) == 1: file = options[0]
     else: file = user_decision(options)
@@ -57,10 +191,11 @@ class Database(MutableMapping):
       else: images.append(Image(key, self.find_file(folder, file)))
     return Images(images, id, seg)
   
+  @profiled
   def scan(self, id) -> Scan:
     if ('scan' in self.kf):
       if 'seg' in self.kf or 'segmentation' in self.kf:
-        options = [file for file in self.files if id in file]
+        options = self.index.search(id)
         if len(options) == 0: raise Exception(f'No data with that ID')
         elif len(options) == 1: file = options[0]
         else: file = user_decision(options)
@@ -73,6 +208,10 @@ class Database(MutableMapping):
   
   def __setitem__(self, key, image : Image):
     self.dictionary[key] = image
+    if image is None: self.recent.pop(key, None)
+    else:
+      self.recent[key] = True
+      self.evict(key)
     
   def __iter__(self):
     return iter(self.dictionary)
@@ -88,6 +227,8 @@ class Database(MutableMapping):
 
   def __delitem__(self, key):
     del self.dictionary[key]
+    self.recent.pop(key, None)
+    self.pinned.discard(key)
   
   def __len__(self):
     return len(self.dictionary)
@@ -97,7 +238,47 @@ class Database(MutableMapping):
     return super().__dir__() + list(self.dictionary.keys())
   
   def __getattr__(self, name) -> Image:
-    if name in self.dictionary:
-      if self.dictionary[name] is None: self.dictionary[name] = self.__call__(name)
-      return self.dictionary[name]
-    raise AttributeError(f"Database object has no attribute '{name}'")
\ No newline at end of file
+    if name in self.dictionary: return self.load(name)
+    raise AttributeError(f"Database object has no attribute '{name}'")
+
+  def load(self, id) -> Image:
+    if id not in self.dictionary: raise Exception(f'{id} is not in the Database')
+    if self.dictionary[id] is None:
+      self.misses += 1
+      self.dictionary[id] = self.__call__(id)
+    else: self.hits += 1
+    self.recent[id] = True
+    self.recent.move_to_end(id)
+    self.evict(id)
+    return self.dictionary[id]
+
+  def evict(self, keep = None):
+    # Subjects only read their arrays once they're drawn, so sizes are measured again every time, and whatever was just used is kept
+    if self.memory_limit is None: return []
+    sizes = {id : footprint(self.dictionary[id].buffers()) for id in self.recent}
+    total, evicted = sum(sizes.values()), []
+    for id in list(self.recent):
+      if total <= self.memory_limit: break
+      if id == keep or id in self.pinned: continue
+      total -= sizes[id]
+      self.dictionary[id] = None
+      del self.recent[id]
+      evicted.append(id)
+    self.evictions += len(evicted)
+    return evicted
+
+  def pin(self, *ids):
+    # Pinned subjects are loaded now and never evicted, for comparing them side by side
+    for id in ids:
+      self.load(id)
+      self.pinned.add(id)
+
+  def unpin(self, *ids):
+    self.pinned.difference_update(ids)
+    self.evict()
+
+  def nbytes(self):
+    return footprint([array for id in self.recent for array in self.dictionary[id].buffers()])
+
+  def cache_info(self):
+    return {'hits' : self.hits, 'misses' : self.misses, 'evictions' : self.evictions, 'loaded' : len(self.recent), 'pinned' : len(self.pinned), 'bytes' : self.nbytes(), 'memory_limit' : self.memory_limit}
\ No newline at end of file
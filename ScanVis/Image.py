@@ -1,18 +1,26 @@
 from __future__ import annotations
 import numpy as np
-import matplotlib.pyplot as plt
-from ipywidgets import interact, fixed
 from typing import Literal
+from .lazy import lazy_import
+from .profiling import profiled
 from .useful_stuff import *
 from .Segmentation import *
 from .Array3D import *
-from matplotlib.colors import LinearSegmentedColormap, ListedColormap, to_rgb, to_rgba, cnames
+from .Viewer import *
+from .render import *
+from .sweep import write_frames
 
-cnames = list(cnames)
+plt = lazy_import('matplotlib.pyplot')
+LinearSegmentedColormap, ListedColormap, to_rgb, to_rgba = lazy_import('matplotlib.colors', 'LinearSegmentedColormap', 'ListedColormap', 'to_rgb', 'to_rgba')
+
+@profiled(name = 'savefig')
+def savefig(*args, **kwargs):
+  # Most of the time drawing markers and images goes here, where matplotlib actually renders the figure
+  return plt.savefig(*args, **kwargs)
 
 class Image(Array3D):
-  def __init__(self, key : str, data, seg : Segmentation = Segmentation(None), id = None, mask = False, normalise = True, centre = None, cmap = 'inferno'):
-    super().__init__(data)
+  def __init__(self, key : str, data, seg : Segmentation = Segmentation(None), id = None, mask = False, normalise = True, centre = None, cmap = 'inferno', lazy = True):
+    super().__init__(data, lazy = lazy)
     self.id = key if id is None else id
     self.key = key
     self.normalise_color(normalise, centre)
@@ -23,13 +31,26 @@ class Image(Array3D):
     if self.mask and not self.seg.isNone: self.mask_image()
 
   def normalise_color(self, normalise = True, centre = None):
-    if normalise:
+    # The colour limits need the whole array, so they're only found once something is drawn
+    self.normalise, self.limits = normalise, None
+    self.limits_centre = centre
+
+  @profiled
+  def find_limits(self):
+    if self.normalise:
       smallest, biggest = np.min(self.array), np.max(self.array)
-      if centre != None:
-        if biggest > -smallest: smallest = (2*centre)-biggest
-        else: biggest = (2*centre)-smallest
-      self.smallest, self.biggest = smallest, biggest
-    else: self.smallest, self.biggest = None, None
+      if self.limits_centre != None:
+        if biggest > -smallest: smallest = (2*self.limits_centre)-biggest
+        else: biggest = (2*self.limits_centre)-smallest
+      self.limits = smallest, biggest
+    else: self.limits = None, None
+    return self.limits
+
+  @property
+  def smallest(self): return (self.limits or self.find_limits())[0]
+
+  @property
+  def biggest(self): return (self.limits or self.find_limits())[1]
 
   def set_cmap(self, cmap, n_alpha = 10):
     if type(cmap) is str:
@@ -52,177 +73,212 @@ class Image(Array3D):
       fig = None
     return ax, ax_exists, fig
 
-  def set_seg(self, seg : Segmentation): self.seg = seg
+  def set_seg(self, seg : Segmentation):
+    self.seg = seg
+    self.cache.clear()
 
   def set_id(self, id : str): self.id = id
 
   def mask_image(self):
-    mask = self.seg.get_mask()
-    self.array = self.array * mask
-    if self.centre is not None: self.array += self.centre * (~mask.astype(bool)).astype(int)
+    # Rather than storing a masked copy of the volume, each slice is masked as it's read
+    # So array is always the unmasked scan - anything that needs the whole masked volume uses masked_array
+    self.mask = True
+    self.cache.clear()
 
-  def plot(self, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slice = 128, structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (5,  5), dpi = 100, save = None, plot_legend = True):
+  def masked_array(self, part = slice(None)):
+    # The volume as drawn, everything outside the segmentation set to centre (or 0) if masked, over part of the first axis to keep copies small
+    array = self.array[part]
+    if not self.mask or self.seg.isNone: return array
+    return np.where(self.seg.array[part] != 0, array, 0 if self.centre is None else self.centre)
+
+  @profiled
+  def read_slice(self, view : Literal['Saggittal', 'Axial', 'Coronal'], slice, level = 0):
+    picture = super().read_slice(view, slice, level)
+    if self.mask and not self.seg.isNone: picture = np.where(self.seg.get_slice(view, slice, level) != 0, picture, 0 if self.centre is None else self.centre)
+    return picture
+
+  def focus(self, view : Literal['Saggittal', 'Axial', 'Coronal'], slice, structure_id, focus = None, margin = 10, move = True):
+    # Zooms in on the structures in focus - everything is cropped to their box plus margin, and if they aren't in slice the one they're biggest in is used
+    # Unless move is False, for when slice has already been named in a title
+    if focus is None: return slice, structure_id, None
+    if self.seg.isNone: raise Exception('No segmentation supplied')
+    if len(np.ravel(structure_id)) == 0: structure_id = [int(s) for s in np.ravel(focus)]
+    return self.seg.focus_slice(view, focus, slice) if move else slice, structure_id, self.seg.get_box(view, focus, margin)
+
+  @profiled
+  def plot(self, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slice = 128, structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (5,  5), dpi = 100, save = None, plot_legend = True, level = 0, focus = None, margin = 10):
     ax, ax_exists, _ = self.check_ax(ax, 1, 1, figsize, dpi)
-    picture = self.get_slice(view, slice)
-    ax.imshow(picture, aspect = 1, cmap = self.cmap, vmin = self.smallest, vmax = self.biggest)
-    ax = self.seg.plot(ax, view, slice, structure_id, fontsize, c, ms, fill_alpha, outline_alpha, flipped, plot_legend)
+    slice, structure_id, crop = self.focus(view, slice, structure_id, focus, margin, title is None)
+    level = self.auto_level(view, level, ax, 600 if save != None else None, crop)
+    picture = self.get_slice(view, slice, level, crop)
+    ax.imshow(picture, aspect = 1, cmap = self.cmap, vmin = self.smallest, vmax = self.biggest, extent = self.level_extent(picture, level, crop))
+    ax = self.seg.plot(ax, view, slice, structure_id, fontsize, c, ms, fill_alpha, outline_alpha, flipped, plot_legend, level = level, crop = crop)
     ax.set(yticks = [], xticks = [], frame_on = False)
     ax.set_xlabel(f'Slice {slice} - {self.id} - {self.key.capitalize()} - {view}' if title is None else title, c = 'w', fontsize = fontsize)
     if ax_exists: return ax
-    if save != None: plt.savefig(save, dpi = 600, bbox_inches = 'tight')
+    if save != None: savefig(save, dpi = 600, bbox_inches = 'tight')
     plt.show()
 
   def interactive(self, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, title = None, fontsize = 8, figsize = (5, 5), dpi = 100):
-    cn = ''.join([f'\'{col}\',' for col in cnames])[:-1]
-    if type(c) not in [list, np.ndarray]: c = [c]
-    initial_structures = [2, 41, 7, 46, 16, 3, 42, 8, 47] + [1] * 68
-
-    # Setting up strings containing a function to be called, and an interact calling it, with custom inputs to vary the UI
-    func_str = f'def plot_str(view, {"".join([f"structure_{i+1} = {initial_structures[i]}, color_{i+1} = \'{cnames[i]}\', " if col is None else f"structure_{i+1} = {initial_structures[i]}, " for i, col in enumerate(c)])}'
-    interact_str = f'interact(plot_str, view = [\'Saggittal\', \'Axial\', \'Coronal\'], {"".join([f"structure_{i+1} = (0,77,1), color_{i+1} = [{cn}], " if col is None else f"structure_{i+1} = (0,77,1), " for i, col in enumerate(c)])}'
-    print(func_str)
-    # Adding interactive components for ms and alphas if they are input as None
-    for item, name, ops in zip([ms, fill_alpha, outline_alpha, fontsize], ['ms = 2', 'fill_alpha = 0.2', 'outline_alpha = 1', 'fontsize = 8'], ['ms = (0,5,0.1)', 'fill_alpha = (0,1,0.01)', 'outline_alpha = (0,1,0.01)', 'fontsize = (4,32,0.1)']):
-      if item is None:
-        func_str += f'{name}, '
-        interact_str += f'{ops}, '
-    
-    # Finalising strings and placing slice as the final input for cleaner UI
-    func_str += 'slice = 100):\n'\
-      f'  plot(view, slice, [{"".join([f"structure_{i+1}, " for i in range(len(c))])[:-2]}], title, fontsize, ms, [{"".join([f"color_{i+1}," if col is None else print_color(col)+"," for i, col in enumerate(c)])[:-1]}], fill_alpha, outline_alpha, flipped, None, figsize, dpi, None, True)\n\n'
-    interact_str += 'slice = (0,255,1))'
+    # Any of c (or entries of it), ms, fill_alpha, outline_alpha and fontsize given as None get their own widget
+    return Viewer([self], 'plot', [2, 41, 7, 46, 16, 3, 42, 8, 47], c, ms, fill_alpha, outline_alpha, flipped, title, fontsize, figsize, dpi).show()
 
-    # Executing the strings to begin the interact
-    exec(func_str+interact_str, {'plot' : self.plot, 'interact' : interact, 'title' : title, 'fontsize' : fontsize, 'ms' : ms, 'c' : c, 'fill_alpha' : fill_alpha, 'outline_alpha' : outline_alpha, 'flipped' : flipped, 'figsize' : figsize, 'dpi' : dpi})
 
-  def overlay(self, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slice = 128, structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (10,  5), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, plot_legend = True):
+  @profiled
+  def overlay(self, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slice = 128, structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (10,  5), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, plot_legend = True, level = 0, focus = None, margin = 10):
     ax, ax_exists, _ = self.check_ax(ax, 2, 1, figsize, dpi, pad, w_pad, h_pad)
-    picture = self.get_slice(view, slice)
-    ax[1].imshow(picture, aspect = 1, cmap = self.cmap, vmin = self.smallest, vmax = self.biggest)
-    ax = self.seg.overlay(ax, view, slice, structure_id, fontsize, c, ms, fill_alpha, outline_alpha, flipped, plot_legend)
+    slice, structure_id, crop = self.focus(view, slice, structure_id, focus, margin, title is None)
+    level = self.auto_level(view, level, ax[1], 600 if save != None else None, crop)
+    picture = self.get_slice(view, slice, level, crop)
+    ax[1].imshow(picture, aspect = 1, cmap = self.cmap, vmin = self.smallest, vmax = self.biggest, extent = self.level_extent(picture, level, crop))
+    ax = self.seg.overlay(ax, view, slice, structure_id, fontsize, c, ms, fill_alpha, outline_alpha, flipped, plot_legend, level, crop = crop)
     ax[1].set(yticks = [], xticks = [], frame_on = False)
     ax[1].set_xlabel(f'Slice {slice} - {self.id} - {self.key.capitalize()} - {view}' if title is None else title, c = 'w', fontsize = fontsize)
     if ax_exists: return ax
-    if save != None: plt.savefig(save, dpi = 600, bbox_inches = 'tight')
+    if save != None: savefig(save, dpi = 600, bbox_inches = 'tight')
     plt.show()  
 
   def interactive_overlay(self, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, title = None, fontsize = 8, figsize = (10, 5), dpi = 100, pad = -2, w_pad = None, h_pad = None):
     N = len(c) if type(c) != str else 1
-    func_str = \
-      f'def overlay_str(view, {"".join([f"structure_{i+1} = {i+2}, " for i in range(N)])}slice = 100):\n'\
-      f'  overlay(view, slice, [{"".join([f"structure_{i+1}, " for i in range(N)])[:-2]}], title, fontsize, ms, c, fill_alpha, outline_alpha, flipped, None, figsize, dpi, pad, w_pad, h_pad, None, True)\n\n'\
-      f'interact(overlay_str, view = [\'Saggittal\', \'Axial\', \'Coronal\'], {"".join([f"structure_{i+1} = (0,77,1), " for i in range(N)])}slice = (0,255,1))'
-    
-    exec(func_str, {'overlay' : self.overlay, 'interact' : interact, 'title' : title, 'fontsize' : fontsize, 'ms' : ms, 'c' : c, 'fill_alpha' : fill_alpha, 'outline_alpha' : outline_alpha, 'flipped' : flipped, 'figsize' : figsize, 'dpi' : dpi, 'pad' : pad, 'w_pad' : w_pad, 'h_pad' : h_pad})
+    return Viewer([self], 'overlay', list(range(2, N+2)), c, ms, fill_alpha, outline_alpha, flipped, title, fontsize, figsize, dpi, pad).show()
 
-  def compare(self, other : Image, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slice = 128, structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (5,  5), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, plot_legend = True):
+
+  @profiled
+  def compare(self, other : Image, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slice = 128, structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (5,  5), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, plot_legend = True, level = 0):
     ax, ax_exists, fig = self.check_ax(ax, 2, 1, figsize, dpi, pad, w_pad, h_pad)
-    ax[0]  = self.plot(view, slice, structure_id, title, fontsize, ms, c, fill_alpha, outline_alpha, flipped, ax[0], plot_legend=plot_legend)
-    ax[1] = other.plot(view, slice, structure_id, title, fontsize, ms, c, fill_alpha, outline_alpha, flipped, ax[1], plot_legend=plot_legend)
+    level = self.auto_level(view, level, ax[0], 600 if save != None else None)
+    ax[0]  = self.plot(view, slice, structure_id, title, fontsize, ms, c, fill_alpha, outline_alpha, flipped, ax[0], plot_legend=plot_legend, level = level)
+    ax[1] = other.plot(view, slice, structure_id, title, fontsize, ms, c, fill_alpha, outline_alpha, flipped, ax[1], plot_legend=plot_legend, level = level)
     if title != None and fig != None: fig.suptitle(title, fontsize = fontsize[1], c = 'w')
     if ax_exists: return ax
-    if save != None: plt.savefig(save, dpi = 600, bbox_inches = 'tight')
+    if save != None: savefig(save, dpi = 600, bbox_inches = 'tight')
     plt.show()
 
   def interactive_compare(self, other : Image, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, title = None, fontsize = 8, figsize = (5, 5), dpi = 100, pad = -2, w_pad = None, h_pad = None):
     N = len(c) if type(c) != str else 1
-    func_str = \
-      f'def compare_str(view, {"".join([f"structure_{i+1} = {i+2}, " for i in range(N)])}slice = 100):\n'\
-      f'  compare(other, view, slice, [{"".join([f"structure_{i+1}, " for i in range(N)])[:-2]}], title, fontsize, ms, c, fill_alpha, outline_alpha, flipped, None, figsize, dpi, pad, w_pad, h_pad, None, True)\n\n'\
-      f'interact(compare_str, view = [\'Saggittal\', \'Axial\', \'Coronal\'], {"".join([f"structure_{i+1} = (0,77,1), " for i in range(N)])}slice = (0,255,1))'
-    
-    exec(func_str, {'compare' : self.compare, 'other' : other, 'interact' : interact, 'title' : title, 'fontsize' : fontsize, 'ms' : ms, 'c' : c, 'fill_alpha' : fill_alpha, 'outline_alpha' : outline_alpha, 'flipped' : flipped,'figsize' : figsize, 'dpi' : dpi, 'pad' : pad, 'w_pad' : w_pad, 'h_pad' : h_pad})
+    return Viewer([self, other], 'compare', list(range(2, N+2)), c, ms, fill_alpha, outline_alpha, flipped, title, fontsize, figsize, dpi, pad).show()
+
 
-  def compare_rgb(self, other : Image, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slice = 128, structure_id = [], title = None, fontsize = 8, ms = 2, c = ['magenta', 'lime'], fill_alpha = 0, outline_alpha = 1, flipped = False, ax = None, figsize = (5,  5), dpi = 100, save = None, plot_legend = True):
+  @profiled
+  def compare_rgb(self, other : Image, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slice = 128, structure_id = [], title = None, fontsize = 8, ms = 2, c = ['magenta', 'lime'], fill_alpha = 0, outline_alpha = 1, flipped = False, ax = None, figsize = (5,  5), dpi = 100, save = None, plot_legend = True, level = 0):
     ax, ax_exists, _ = self.check_ax(ax, 1, 1, figsize, dpi)
-    rgb = np.zeros((256, 256, 3))
-    picture = self.get_slice(view, slice)
-    rgb[:,:,0] = picture
-    rgb[:,:,2] = picture
-    rgb[:,:,1] = other.get_slice(view, slice)
-    for i in [0,1,2]: rgb[:,:,i] /= np.max(rgb[:,:,i])*2
-    ax.imshow(rgb)
-    ax = self.seg.plot(ax, view, slice, structure_id, fontsize, c[::2], ms, fill_alpha, outline_alpha, flipped, False, self.id+' ')
-    ax = other.seg.plot(ax, view, slice, structure_id, fontsize, c[1::2], ms, fill_alpha, outline_alpha, flipped, False, other.id+' ')
+    level = self.auto_level(view, level, ax, 600 if save != None else None)
+    picture = self.get_slice(view, slice, level)
+    ax.imshow(rgb_compare(picture, other.get_slice(view, slice, level)), extent = self.level_extent(picture, level))
+    ax = self.seg.plot(ax, view, slice, structure_id, fontsize, c[::2], ms, fill_alpha, outline_alpha, flipped, False, self.id+' ', level)
+    ax = other.seg.plot(ax, view, slice, structure_id, fontsize, c[1::2], ms, fill_alpha, outline_alpha, flipped, False, other.id+' ', level)
     ax.set(yticks = [], xticks = [], frame_on = False)
     ax.set_xlabel(f'Slice {slice} - {self.id} - {other.id} - {view}' if title is None else title, c = 'w', fontsize = fontsize)
     if plot_legend and len(structure_id) > 0: ax.legend(labelcolor = 'white', facecolor = 'k', markerscale = 2, loc = 'upper right', fontsize = fontsize)
     if ax_exists: return ax
-    if save != None: plt.savefig(save, dpi = 600, bbox_inches = 'tight')
+    if save != None: savefig(save, dpi = 600, bbox_inches = 'tight')
     plt.show()
 
   def interactive_compare_rgb(self, other : Image, ms = 2, c = 'w', fill_alpha = 0, outline_alpha = 1, flipped = False, title = None, fontsize = 8, figsize = (10, 5), dpi = 100):
     N = int(len(c)/2) if type(c) != str else 1
-    func_str = \
-      f'def compare_rgb_str(view, {"".join([f"structure_{i+1} = {i+2}, " for i in range(N)])}slice = 100):\n'\
-      f'  compare_rgb(other, view, slice, [{"".join([f"structure_{i+1}, " for i in range(N)])[:-2]}], title, fontsize, ms, c, fill_alpha, outline_alpha, flipped, None, figsize, dpi, None, True)\n\n'\
-      f'interact(compare_rgb_str, view = [\'Saggittal\', \'Axial\', \'Coronal\'], {"".join([f"structure_{i+1} = (0,77,1), " for i in range(N)])}slice = (0,255,1))'
-    
-    exec(func_str, {'compare_rgb' : self.compare_rgb, 'other' : other, 'interact' : interact, 'title' : title, 'fontsize' : fontsize, 'ms' : ms, 'c' : c, 'fill_alpha' : fill_alpha, 'outline_alpha' : outline_alpha, 'flipped' : flipped, 'figsize' : figsize, 'dpi' : dpi})
+    return Viewer([self, other], 'compare_rgb', list(range(2, N+2)), c, ms, fill_alpha, outline_alpha, flipped, title, fontsize, figsize, dpi).show()
+
 
-  def plot_three(self, slices = [128, 128, 128], structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (4,4), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, plot_legend = True): 
+  @profiled
+  def render_slice(self, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slice = 128, structure_id = [], other : Image = None, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, level = 0, background = 'k', crop = None):
+    # One slice composited straight into an RGBA array with no figure - the image (or its rgb comparison with other), then fills and outlines
+    picture = self.get_slice(view, slice, level, crop)
+    if other is None: layer = colormap_layer(picture, self.cmap, self.smallest, self.biggest)
+    else: layer = rgb_layer(rgb_compare(picture, other.get_slice(view, slice, level, crop)))
+    if type(structure_id) not in [list, np.ndarray]: structure_id = [structure_id]
+    c = list(c) if type(c) in [list, np.ndarray] else [c]
+    for seg, colors in [(self.seg, c)] if other is None else [(self.seg, c[::2]), (other.seg, c[1::2] or c)]:
+      if seg.isNone or len(structure_id) == 0: continue
+      seg.paint(layer, view, slice, structure_id, [colors[i % len(colors)] for i in range(len(structure_id))], fill_alpha, outline_alpha, flipped, level, crop = crop)
+    return layer_to_uint8(layer, None if background is None else to_rgb(background))
+
+  def sweep(self, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slices = None, structure_id = [], other : Image = None, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, level = 0, background = 'k'):
+    # Yields an RGBA frame for each slice, every slice of the view by default, only ever drawing one at a time
+    if slices is None: slices = range(self.shape[self.view_axis(view)])
+    for slice in slices: yield self.render_slice(view, slice, structure_id, other, c, fill_alpha, outline_alpha, flipped, level, background)
+
+  def save_sweep(self, file, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slices = None, structure_id = [], other : Image = None, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, level = 0, background = 'k', fps = 10):
+    # file is a .gif, a .npy of stacked frames, or a folder (or pattern like 'sweep/{:03d}.png') for one PNG per slice
+    if slices is None: slices = range(self.shape[self.view_axis(view)])
+    return write_frames(self.sweep(view, slices, structure_id, other, c, fill_alpha, outline_alpha, flipped, level, background), file, slices, fps)
+
+
+  @profiled
+  def plot_three(self, slices = [128, 128, 128], structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (4,4), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, plot_legend = True, level = 0): 
     ax, ax_exists, fig = self.check_ax(ax, 3, 1, figsize, dpi, pad, w_pad, h_pad)
-    for i, view in enumerate(['Saggittal', 'Axial', 'Coronal']): ax[i] = self.plot(view, slices[i], structure_id, None, fontsize, ms, c, fill_alpha, outline_alpha, ax[i], plot_legend = i == 2 and plot_legend)
+    for i, view in enumerate(['Saggittal', 'Axial', 'Coronal']): ax[i] = self.plot(view, slices[i], structure_id, None, fontsize, ms, c, fill_alpha, outline_alpha, flipped, ax[i], plot_legend = i == 2 and plot_legend, level = self.auto_level(view, level, ax[i], 600 if save != None else None))
     if title != None and fig != None: fig.suptitle(title, fontsize = fontsize[1], c = 'w')
     if ax_exists: return ax
-    if save != None: plt.savefig(save, dpi = 600, bbox_inches='tight')
+    if save != None: savefig(save, dpi = 600, bbox_inches='tight')
     plt.show()
 
-  def compare_three(self, other : Image, slices = [128, 128, 128], structure_id = [], title = None, fontsize = 8, ms = 2, c = ['magenta', 'lime'], fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (4,4), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, plot_legend = True): 
+  @profiled
+  def compare_three(self, other : Image, slices = [128, 128, 128], structure_id = [], title = None, fontsize = 8, ms = 2, c = ['magenta', 'lime'], fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (4,4), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, plot_legend = True, level = 0): 
     ax, ax_exists, fig = self.check_ax(ax, 3, 2, figsize, dpi, pad, w_pad, h_pad)
-    for i, view in enumerate(['Saggittal', 'Axial', 'Coronal']): ax[0][i] = self.plot(view, slices[i], structure_id, None, fontsize, ms, c, fill_alpha, outline_alpha, flipped, ax[0][i], plot_legend = i == 2 and plot_legend)
-    for i, view in enumerate(['Saggittal', 'Axial', 'Coronal']): ax[1][i] = other.plot(view, slices[i], structure_id, None, fontsize, ms, c, fill_alpha, outline_alpha, flipped, ax[1][i], plot_legend = i == 2 and plot_legend)
+    for i, view in enumerate(['Saggittal', 'Axial', 'Coronal']): ax[0][i] = self.plot(view, slices[i], structure_id, None, fontsize, ms, c, fill_alpha, outline_alpha, flipped, ax[0][i], plot_legend = i == 2 and plot_legend, level = self.auto_level(view, level, ax[0][i], 600 if save != None else None))
+    for i, view in enumerate(['Saggittal', 'Axial', 'Coronal']): ax[1][i] = other.plot(view, slices[i], structure_id, None, fontsize, ms, c, fill_alpha, outline_alpha, flipped, ax[1][i], plot_legend = i == 2 and plot_legend, level = self.auto_level(view, level, ax[1][i], 600 if save != None else None))
     if title != None and fig != None: fig.suptitle(title, fontsize = fontsize[1], c = 'w')
     if ax_exists: return ax
-    if save != None: plt.savefig(save, dpi = 600, bbox_inches='tight')
+    if save != None: savefig(save, dpi = 600, bbox_inches='tight')
     plt.show()
 
-  def compare_three_rgb(self, other : Image, slices = [128, 128, 128], structure_id = [], title = None, fontsize = 8, ms = 2, c = ['magenta', 'lime'], fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (4,4), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, plot_legend = True): 
+  @profiled
+  def compare_three_rgb(self, other : Image, slices = [128, 128, 128], structure_id = [], title = None, fontsize = 8, ms = 2, c = ['magenta', 'lime'], fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (4,4), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, plot_legend = True, level = 0): 
     ax, ax_exists, fig = self.check_ax(ax, 3, 1, figsize, dpi, pad, w_pad, h_pad)
-    for i, view in enumerate(['Saggittal', 'Axial', 'Coronal']): ax[i] = self.compare_rgb(other, view, slices[i], structure_id, None, fontsize, ms, c, fill_alpha, outline_alpha, flipped, ax[i], plot_legend = i == 2 and plot_legend)
+    for i, view in enumerate(['Saggittal', 'Axial', 'Coronal']): ax[i] = self.compare_rgb(other, view, slices[i], structure_id, None, fontsize, ms, c, fill_alpha, outline_alpha, flipped, ax[i], plot_legend = i == 2 and plot_legend, level = self.auto_level(view, level, ax[i], 600 if save != None else None))
     if title != None and fig != None: fig.suptitle(title, fontsize = fontsize[1], c = 'w')
     if ax_exists: return ax
-    if save != None: plt.savefig(save, dpi = 600, bbox_inches='tight')
+    if save != None: savefig(save, dpi = 600, bbox_inches='tight')
     plt.show()
 
-  def plot_hella_slices(self, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slices = 5, buffer = 10, structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (3,3), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, label_slices = True, label_images = False, plot_legend = True): 
+  @profiled
+  def plot_hella_slices(self, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slices = 5, buffer = 10, structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (3,3), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, label_slices = True, label_images = False, plot_legend = True, level = 0, focus = None, margin = 10): 
     ax, ax_exists, fig = self.check_ax(ax, slices, 1, figsize, dpi, pad, w_pad, h_pad)
     if type(buffer) not in [list, np.ndarray]: buffer = [buffer, buffer]
     if type(fontsize) not in [list, np.ndarray]: fontsize = [fontsize, fontsize]
-    if type(slices) == int: slices = self.seg.get_slices(view, slices, buffer)
-    for i, slice in enumerate(slices): ax[i] = self.plot(view, slices[i], structure_id, f'Slice {slice}' if label_slices else None if label_images else '', fontsize[0], ms, c, fill_alpha, outline_alpha, flipped, ax[i], plot_legend = (i == len(slices)-1) and plot_legend)
+    # With focus, the slices are spread over the slices the structures are in rather than the whole segmentation's extent
+    # Slices given without the structures in them are swapped for the one they're biggest in, once, before anything is titled
+    if type(slices) == int: slices = self.seg.get_slices(view, slices, buffer, focus)
+    elif focus is not None: slices = list(dict.fromkeys(self.seg.focus_slice(view, focus, slice) for slice in slices))
+    crop = None if focus is None else self.seg.get_box(view, focus, margin)
+    for i, slice in enumerate(slices): ax[i] = self.plot(view, slices[i], structure_id, f'Slice {slice}' if label_slices else None if label_images else '', fontsize[0], ms, c, fill_alpha, outline_alpha, flipped, ax[i], plot_legend = (i == len(slices)-1) and plot_legend, level = self.auto_level(view, level, ax[i], 600 if save != None else None, crop), focus = focus, margin = margin)
+    # Structures in fewer slices than asked for leave some panels empty
+    for unused in ax[len(slices):]: unused.set_visible(False)
     if title != None and fig != None: fig.suptitle(title, fontsize = fontsize[1], c = 'w')
     if ax_exists: return ax
-    if save != None: plt.savefig(save, dpi = 600, bbox_inches='tight')
+    if save != None: savefig(save, dpi = 600, bbox_inches='tight')
     plt.show()
   
-  def compare_hella_slices(self, other : Image, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slices = 5, buffer = 10, structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (3,3), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, label_slices = True, label_images = False, plot_legend = True): 
+  @profiled
+  def compare_hella_slices(self, other : Image, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slices = 5, buffer = 10, structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (3,3), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, label_slices = True, label_images = False, plot_legend = True, level = 0): 
     ax, ax_exists, fig = self.check_ax(ax, slices, 2, figsize, dpi, pad, w_pad, h_pad)
     if type(buffer) not in [list, np.ndarray]: buffer = [buffer, buffer]
     if type(fontsize) not in [list, np.ndarray]: fontsize = [fontsize, fontsize]
     if type(label_slices) not in [list, np.ndarray]: label_slices = [label_slices, label_slices]
     if type(slices) == int: slices = self.seg.get_slices(view, slices, buffer)
-    for i, slice in enumerate(slices): ax[0][i] = self.plot(view, slices[i], structure_id, f'Slice {slice}' if label_slices[0] else None if label_images else '', fontsize[0], ms, c, fill_alpha, outline_alpha, flipped, ax[0][i], plot_legend = (i == len(slices)-1) and plot_legend)
-    for i, slice in enumerate(slices): ax[1][i] = other.plot(view, slices[i], structure_id, f'Slice {slice}' if label_slices[1] else None if label_images else '', fontsize[0], ms, c, fill_alpha, outline_alpha, flipped, ax[1][i])
+    for i, slice in enumerate(slices): ax[0][i] = self.plot(view, slices[i], structure_id, f'Slice {slice}' if label_slices[0] else None if label_images else '', fontsize[0], ms, c, fill_alpha, outline_alpha, flipped, ax[0][i], plot_legend = (i == len(slices)-1) and plot_legend, level = self.auto_level(view, level, ax[0][i], 600 if save != None else None))
+    for i, slice in enumerate(slices): ax[1][i] = other.plot(view, slices[i], structure_id, f'Slice {slice}' if label_slices[1] else None if label_images else '', fontsize[0], ms, c, fill_alpha, outline_alpha, flipped, ax[1][i], level = self.auto_level(view, level, ax[1][i], 600 if save != None else None))
     ax[0][0].set_ylabel(f'{self.id} {view}', color = 'w', fontsize = fontsize[0])
     ax[1][0].set_ylabel(f'{other.id} {view}', color = 'w', fontsize = fontsize[0])
     if title != None and fig != None: fig.suptitle(title, fontsize = fontsize[1], c = 'w')
     if ax_exists: return ax
-    if save != None: plt.savefig(save, dpi = 600, bbox_inches='tight')
+    if save != None: savefig(save, dpi = 600, bbox_inches='tight')
     plt.show()
 
-  def compare_hella_slices_rgb(self, other : Image, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slices = 5, buffer = 10, structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (3,3), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, label_slices = True, label_images = False, plot_legend = True): 
+  @profiled
+  def compare_hella_slices_rgb(self, other : Image, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slices = 5, buffer = 10, structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (3,3), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, label_slices = True, label_images = False, plot_legend = True, level = 0): 
     ax, ax_exists, fig = self.check_ax(ax, slices, 1, figsize, dpi, pad, w_pad, h_pad)
     if type(buffer) not in [list, np.ndarray]: buffer = [buffer, buffer]
     if type(fontsize) not in [list, np.ndarray]: fontsize = [fontsize, fontsize]
     if type(slices) == int: slices = self.seg.get_slices(view, slices, buffer)
-    for i, slice in enumerate(slices): ax[i] = self.compare_rgb(other, view, slices[i], structure_id, f'Slice {slice}' if label_slices else None if label_images else '', fontsize[0], ms, c, fill_alpha, outline_alpha, flipped, ax[i], plot_legend = (i == len(slices)-1) and plot_legend)
+    for i, slice in enumerate(slices): ax[i] = self.compare_rgb(other, view, slices[i], structure_id, f'Slice {slice}' if label_slices else None if label_images else '', fontsize[0], ms, c, fill_alpha, outline_alpha, flipped, ax[i], plot_legend = (i == len(slices)-1) and plot_legend, level = self.auto_level(view, level, ax[i], 600 if save != None else None))
     if title != None and fig != None: fig.suptitle(title, fontsize = fontsize[1], c = 'w')
     if ax_exists: return ax
-    if save != None: plt.savefig(save, dpi = 600, bbox_inches='tight')
+    if save != None: savefig(save, dpi = 600, bbox_inches='tight')
     plt.show()
 
-  def plot_buttloads_of_slices(self, slices = 5, buffer = 10, structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (3, 3), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, label_slices = True, label_images = False, plot_legend = True): 
+  @profiled
+  def plot_buttloads_of_slices(self, slices = 5, buffer = 10, structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (3, 3), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, label_slices = True, label_images = False, plot_legend = True, level = 0): 
     ax, ax_exists, fig = self.check_ax(ax, slices, 3, figsize, dpi, pad, w_pad, h_pad)
     
     # Allowed buffer inputs are a, [a, b], or [[a, b], [c, d], [e, f]]
@@ -231,16 +287,17 @@ class Image(Array3D):
     if type(fontsize) not in [list, np.ndarray]: fontsize = [fontsize, fontsize]
     if type(label_slices) not in [list, np.ndarray]: label_slices = [label_slices, label_slices]
 
-    for i, view in enumerate(['Saggittal', 'Axial', 'Coronal']): ax[i] = self.plot_hella_slices(view, slices, buffer[i], structure_id, None, fontsize, ms, c, fill_alpha, outline_alpha, flipped, ax[i], label_slices = label_slices, label_images=label_images, plot_legend = (i == 0) and plot_legend)
+    for i, view in enumerate(['Saggittal', 'Axial', 'Coronal']): ax[i] = self.plot_hella_slices(view, slices, buffer[i], structure_id, None, fontsize, ms, c, fill_alpha, outline_alpha, flipped, ax[i], label_slices = label_slices, label_images=label_images, plot_legend = (i == 0) and plot_legend, level = self.auto_level(view, level, ax[i][0], 600 if save != None else None))
     ax[0][0].set_ylabel('Saggittal', color = 'w', fontsize = fontsize[0])
     ax[1][0].set_ylabel('Axial', color = 'w', fontsize = fontsize[0])
     ax[2][0].set_ylabel('Coronal', color = 'w', fontsize = fontsize[0])
     if title != None and fig != None: fig.suptitle(title, fontsize = fontsize[1], c = 'w')
     if ax_exists: return ax
-    if save != None: plt.savefig(save, dpi = 600, bbox_inches='tight')
+    if save != None: savefig(save, dpi = 600, bbox_inches='tight')
     plt.show()
 
-  def compare_buttloads_of_slices(self, other : Image, slices = 5, buffer = 10, structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (3, 3), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, label_slices = True, label_images = False, plot_legend = True): 
+  @profiled
+  def compare_buttloads_of_slices(self, other : Image, slices = 5, buffer = 10, structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (3, 3), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, label_slices = True, label_images = False, plot_legend = True, level = 0): 
     ax, ax_exists, fig = self.check_ax(ax, slices, 6, figsize, dpi, pad, w_pad, h_pad)
     
     # Allowed buffer inputs are a, [a, b], or [[a, b], [c, d], [e, f]]
@@ -248,13 +305,14 @@ class Image(Array3D):
     elif len(np.shape(buffer)) == 1: buffer = [buffer]*3
     if type(fontsize) not in [list, np.ndarray]: fontsize = [fontsize, fontsize]
 
-    for i, view in enumerate(['Saggittal', 'Axial', 'Coronal']): ax[2*i:2*i+2] = self.compare_hella_slices(other, view, slices, buffer[i], structure_id, None, fontsize, ms, c, fill_alpha, outline_alpha, flipped, ax[2*i:2*i+2], label_slices = label_slices, label_images=label_images, plot_legend = (i == 0) and plot_legend)
+    for i, view in enumerate(['Saggittal', 'Axial', 'Coronal']): ax[2*i:2*i+2] = self.compare_hella_slices(other, view, slices, buffer[i], structure_id, None, fontsize, ms, c, fill_alpha, outline_alpha, flipped, ax[2*i:2*i+2], label_slices = label_slices, label_images=label_images, plot_legend = (i == 0) and plot_legend, level = self.auto_level(view, level, ax[2*i][0], 600 if save != None else None))
     if title != None and fig != None: fig.suptitle(title, fontsize = fontsize[1], c = 'w')
     if ax_exists: return ax
-    if save != None: plt.savefig(save, dpi = 600, bbox_inches='tight')
+    if save != None: savefig(save, dpi = 600, bbox_inches='tight')
     plt.show()
 
-  def compare_buttloads_of_slices_rgb(self, other : Image, slices = 5, buffer = 10, structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (3, 3), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, label_slices = True, label_images = False, plot_legend = True): 
+  @profiled
+  def compare_buttloads_of_slices_rgb(self, other : Image, slices = 5, buffer = 10, structure_id = [], title = None, fontsize = 8, ms = 2, c = 'w', fill_alpha = 0.2, outline_alpha = 1, flipped = False, ax = None, figsize = (3, 3), dpi = 100, pad = -2, w_pad = None, h_pad = None, save = None, label_slices = True, label_images = False, plot_legend = True, level = 0): 
     ax, ax_exists, fig = self.check_ax(ax, slices, 3, figsize, dpi, pad, w_pad, h_pad)
     
     # Allowed buffer inputs are a, [a, b], or [[a, b], [c, d], [e, f]]
@@ -263,11 +321,11 @@ class Image(Array3D):
     if type(fontsize) not in [list, np.ndarray]: fontsize = [fontsize, fontsize]
     if type(label_slices) not in [list, np.ndarray]: label_slices = [label_slices, label_slices]
 
-    for i, view in enumerate(['Saggittal', 'Axial', 'Coronal']): ax[i] = self.compare_hella_slices_rgb(other, view, slices, buffer[i], structure_id, None, fontsize, ms, c, fill_alpha, outline_alpha, flipped, ax[i], label_slices = label_slices, label_images=label_images, plot_legend = (i == 0) and plot_legend)
+    for i, view in enumerate(['Saggittal', 'Axial', 'Coronal']): ax[i] = self.compare_hella_slices_rgb(other, view, slices, buffer[i], structure_id, None, fontsize, ms, c, fill_alpha, outline_alpha, flipped, ax[i], label_slices = label_slices, label_images=label_images, plot_legend = (i == 0) and plot_legend, level = self.auto_level(view, level, ax[i][0], 600 if save != None else None))
     ax[0][0].set_ylabel('Saggittal', color = 'w', fontsize = fontsize[0])
     ax[1][0].set_ylabel('Axial', color = 'w', fontsize = fontsize[0])
     ax[2][0].set_ylabel('Coronal', color = 'w', fontsize = fontsize[0])
     if title != None and fig != None: fig.suptitle(title, fontsize = fontsize[1], c = 'w')
     if ax_exists: return ax
-    if save != None: plt.savefig(save, dpi = 600, bbox_inches='tight')
+    if save != None: savefig(save, dpi = 600, bbox_inches='tight')
     plt.show()
\ No newline at end of file
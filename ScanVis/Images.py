@@ -25,6 +25,18 @@ class Images(MutableMapping):
   def mask_image(self, key = 'scan', new_key = 'brain', normalise = True, centre = None, cmap = 'inferno'):
     self.images[new_key] = Image(new_key, self.images[key].array, self.images[key].seg, self.id, True, normalise = normalise, centre = centre, cmap = cmap)
 
+  def load(self):
+    # Reads every file now rather than the first time something is drawn
+    for image in self.images.values():
+      image.load()
+      if not image.seg.isNone: image.seg.load()
+    return self
+
+  def buffers(self):
+    arrays = []
+    for image in self.images.values(): arrays += image.buffers() + image.seg.buffers()
+    return arrays
+
   def __getitem__(self, key) -> Image:
     return self.images[key]
   
@@ -5,6 +5,8 @@ class Scan(Images):
   def __init__(self, scan, seg, id : str = None):
     self.scan_file = scan
     self.seg_file = seg
+    # All three images share the scan and segmentation arrays, nothing is copied
+    seg = Segmentation(seg)
     super().__init__([
       Image('scan', scan),
       Image('brain', scan, mask = True),
@@ -1,50 +1,147 @@
 from __future__ import annotations
 import numpy as np
-import matplotlib.pyplot as plt
-import SimpleITK as sitk
 import os
-from ipywidgets import interact, fixed
-from skimage.transform import rotate
 from typing import Literal
+from .lazy import lazy_import
+from .profiling import profiled
 from .useful_stuff import *
+from .edges import *
 from .Array3D import *
-from matplotlib.colors import LinearSegmentedColormap, ListedColormap, to_rgb, to_rgba
-
-def find_edges_1D(arr):
-  string_arr = ''.join(arr.astype(int).astype(str))
-  edge_arr = string_arr.replace('01', '02').replace('10', '20') # Turn any True by a False to a 2
-  edge_arr = (np.array(list(edge_arr)).astype(int) - 2).astype(bool)
-  return ~edge_arr
-
-def find_edges_2D(arr):
-  x_arr = np.array([find_edges_1D(line) for line in arr])
-  y_arr = np.swapaxes(np.array([find_edges_1D(line) for line in np.swapaxes(arr, 0, 1)]),0,1)
-  edge_arr = x_arr | y_arr
-  return edge_arr
-
-def find_structure_edges(image, structure_id):
-  image = ~(image - structure_id).astype(bool)
-  image = find_edges_2D(image)
-  return image
-
-def find_structure_coords(image, structure_id):
-  image = find_structure_edges(image, structure_id)
-  y, x = np.where(image)
-  return x, y
-
-def find_structure_and_outline(image, structure_id):
-  image = ~(image - structure_id).astype(bool)
-  edges = find_edges_2D(image)
-  y, x = np.where(edges)
-  return image.astype(int), x, y 
+from .render import *
+from .overlap import confusion_matrix, overlap_table
+
+# Only imported once something is drawn or measured
+plt, sitk = lazy_import('matplotlib.pyplot'), lazy_import('SimpleITK')
+find_objects = lazy_import('scipy.ndimage', 'find_objects')
+LinearSegmentedColormap, ListedColormap, to_rgb, to_rgba = lazy_import('matplotlib.colors', 'LinearSegmentedColormap', 'ListedColormap', 'to_rgb', 'to_rgba')
 
 class Segmentation(Array3D):
-  def __init__(self, data): super().__init__(data)
+  # With raster on, plot and overlay draw every fill and outline of a slice as one RGBA image instead of a marker per edge pixel
+  # Set it on the class to change every segmentation, or on one segmentation, or pass raster to plot
+  raster = False
+
+  def __init__(self, data, lazy = True): super().__init__(data, lazy = lazy)
+
+  def compact(self, array):
+    # Labels are stored in the smallest unsigned type that holds them - uint8 for FreeSurfer's subcortical labels
+    if array.dtype.kind not in 'buif' or array.size == 0: return array
+    smallest, biggest = array.min(), array.max()
+    if smallest < 0: return array
+    dtype = np.dtype(np.uint8 if biggest < 2**8 else np.uint16 if biggest < 2**16 else np.uint32)
+    if array.dtype.kind in 'bu' and array.dtype.itemsize <= dtype.itemsize: return array
+    return array.astype(dtype)
+
+  def downsample(self, array):
+    # Nearest neighbour, as averaging labels would invent ones that aren't there
+    return array[::2, ::2, ::2]
+
+  @profiled
+  def get_boxes(self):
+    # Bounding box of every label as [[first, last], ...] along each array axis, all found in one pass over the volume
+    if 'boxes' not in self.extents:
+      labels = self.array if self.array.dtype.kind in 'ui' else self.array.astype(int)
+      objects = find_objects(labels)
+      boxes = np.full((len(objects)+1, 3, 2), -1)
+      boxes[0] = [[0, n-1] for n in labels.shape]
+      for label, box in enumerate(objects, 1):
+        if box is not None: boxes[label] = [[s.start, s.stop-1] for s in box]
+      self.extents['boxes'] = boxes
+    return self.extents['boxes']
+
+  @profiled
+  def get_histogram(self, view : Literal['Saggittal', 'Axial', 'Coronal']):
+    # Voxels of every label in every slice of a view, as [slice, label], counted with one bincount per block of slices and kept for next time
+    if ('histogram', view) not in self.extents:
+      labels = np.moveaxis(self.array, self.view_axis(view), 0)
+      n = len(self.get_boxes())
+      histogram = np.zeros((labels.shape[0], n), np.int32)
+      step = max(1, 2**22 // labels[0].size)
+      for start in range(0, len(labels), step):
+        block = labels[start:start+step]
+        index = block + (np.arange(len(block)) * n)[:, None, None]
+        histogram[start:start+len(block)] = np.bincount(index.ravel(), minlength = len(block)*n).reshape(len(block), n)
+      self.extents[('histogram', view)] = histogram[self.to_slice(view, np.arange(len(histogram)))]
+    return self.extents[('histogram', view)]
+
+  def slices_containing(self, view : Literal['Saggittal', 'Axial', 'Coronal'], structure_id):
+    histogram = self.get_histogram(view)
+    structure_id = [s for s in np.ravel(structure_id) if 0 <= s < histogram.shape[1]]
+    return np.flatnonzero(histogram[:, structure_id].any(1))
+
+  def get_label_names(self):
+    if 'names' not in self.extents: self.extents['names'] = np.array([f'{lut[s]} ({s})' if s in lut else str(s) for s in range(len(self.get_boxes()))])
+    return self.extents['names']
+
+  def confusion(self, other : Segmentation):
+    # Voxels labelled labels[i] here and labels[j] in other at [i, j], for the labels in either - (matrix, labels)
+    return confusion_matrix(self.array, other.array)
+
+  def compare(self, other : Segmentation, structure_id = None, surface = True):
+    # Dice, Jaccard, volumes and volume difference (in cm³) and surface distances (in mm), from this segmentation's spacing, for every label or just structure_id
+    if structure_id is not None and type(structure_id) not in [list, np.ndarray]: structure_id = [structure_id]
+    return overlap_table(self.array, other.array, structure_id, self.header['spacing'], surface)
+
+  @profiled
+  def get_extent(self, view : Literal['Saggittal', 'Axial', 'Coronal'], structure_id = None):
+    if structure_id is None: return super().get_extent(view)
+    boxes = self.get_boxes()
+    boxes = boxes[[s for s in np.ravel(structure_id) if 0 <= s < len(boxes)]]
+    boxes = boxes[boxes[:, 0, 0] >= 0]
+    if len(boxes) == 0: raise Exception(f'Structure {structure_id} not in segmentation')
+    axis = self.view_axis(view)
+    return tuple(sorted([self.to_slice(view, boxes[:, axis, 0].min()), self.to_slice(view, boxes[:, axis, 1].max())]))
+
+  def get_slices(self, view : Literal['Saggittal', 'Axial', 'Coronal'], slices, buffer, structure_id = None):
+    if structure_id is not None:
+      # Only slices the structures are actually in, so structures apart from each other never leave slices of neither between them
+      # Structures are often thinner than the buffer meant for the whole segmentation, so it's dropped unless it leaves a slice for every slice asked for
+      # The slices are spread evenly over those, in order and without repeats - structures in fewer slices than asked for get one of each
+      containing = self.slices_containing(view, structure_id)
+      if len(containing) == 0: raise Exception(f'Structure {structure_id} not in segmentation')
+      buffer = [max(0, b) for b in buffer]
+      inside = containing[(containing >= containing[0] + buffer[0]) & (containing <= containing[-1] - buffer[1])]
+      if len(inside) >= slices: containing = inside
+      return containing[np.unique(np.linspace(0, len(containing) - 1, slices).astype(int))]
+    start, end = self.get_extent(view)
+    slices = np.linspace(start+buffer[0], end-buffer[1], slices).astype(int)
+    return slices
+
+  def get_box(self, view : Literal['Saggittal', 'Axial', 'Coronal'], structure_id, margin = 10):
+    # The rows and columns of a view's slices the structures ever reach, plus margin, as a crop for get_slice - straight from get_boxes
+    boxes = self.get_boxes()
+    boxes = boxes[[s for s in np.ravel(structure_id) if 0 < s < len(boxes)]]
+    boxes = boxes[boxes[:, 0, 0] >= 0]
+    if len(boxes) == 0: raise Exception(f'Structure {structure_id} not in segmentation')
+    first, last = boxes[:, :, 0].min(0), boxes[:, :, 1].max(0)
+    def span(axis, reversed):
+      n = self.shape[axis]
+      start, end = (n-1-last[axis], n-first[axis]) if reversed else (first[axis], last[axis]+1)
+      return max(int(start)-margin, 0), min(int(end)+margin, n)
+    # Which array axis runs down and across each view, and whether it's flipped, from read_slice
+    rows, columns = {'Saggittal' : ((1, False), (0, True)), 'Axial' : ((0, True), (2, True))}.get(view, ((1, False), (2, True)))
+    return span(*rows) + span(*columns)
+
+  def focus_slice(self, view : Literal['Saggittal', 'Axial', 'Coronal'], structure_id, slice = None):
+    # slice if the structures are in it, otherwise the slice where they're biggest
+    histogram = self.get_histogram(view)
+    structure_id = [s for s in np.ravel(structure_id) if 0 < s < histogram.shape[1]]
+    if slice is not None and 0 <= slice < len(histogram) and histogram[slice, structure_id].any(): return slice
+    return int(histogram[:, structure_id].sum(1).argmax())
 
-  def plot(self, ax, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slice = 120, structure_id = 0, fontsize = 8, color = 'w', ms = 2, fill_alpha = 0.2, outline_alpha = 1, flipped = False, plot_legend = True, label_start = ''):
+  @profiled
+  def get_outlines(self, view : Literal['Saggittal', 'Axial', 'Coronal'], slice, level = 0, crop = None):
+    # Shared by every Image using this segmentation, so each slice is only traced once - and only inside crop if there is one
+    key = ('outlines', view, slice) if level == 0 else ('outlines', view, slice, level)
+    if crop is not None: key = key + (tuple(crop),)
+    try: return self.cache[key]
+    except KeyError: outlines = self.cache[key] = find_label_outlines(self.get_slice(view, slice, level, crop))
+    return outlines
+
+  @profiled
+  def plot(self, ax, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slice = 120, structure_id = 0, fontsize = 8, color = 'w', ms = 2, fill_alpha = 0.2, outline_alpha = 1, flipped = False, plot_legend = True, label_start = '', level = 0, raster = None, crop = None):
     if type(structure_id) is int: structure_id = [structure_id]
     if self.isNone or len(structure_id) == 0: return ax
-    picture = self.get_slice(view, slice)
+    picture = self.get_slice(view, slice, level, crop)
     if type(structure_id) not in [list, np.ndarray]: structure_id = [structure_id]
     if type(color) not in [list, np.ndarray]: color = [color]
     if type(ms) not in [list, np.ndarray]: ms = [ms] * len(structure_id)
@@ -52,52 +149,95 @@ class Segmentation(Array3D):
     if type(outline_alpha) not in [list, np.ndarray]: outline_alpha = [outline_alpha] * len(structure_id)
     if type(flipped) not in [list, np.ndarray]: flipped = [flipped] * len(structure_id)
 
-    for s, c, m, f, o, fl in zip(structure_id, color, ms, fill_alpha, outline_alpha, flipped):
-      c = list(to_rgb(c))
-      fill, x, y = find_structure_and_outline(picture, s)
-      ax.plot(x, y, 'o', c = c, alpha = o, ms = m)#, label = label_start + lut[s] if s in lut else None)
-      ax.plot([], [], 'o', c = c, ms = 5, label = label_start + lut[s] if s in lut else None)
-      if f > 0:
-        fill_cmap = LinearSegmentedColormap.from_list('my_cmap', [[0,0,0,0], c+[f]], 2)
-        if fl: ax.imshow(~fill+2, cmap = fill_cmap, vmin = 0, vmax = 1)
-        else: ax.imshow(fill, cmap = fill_cmap, vmin = 0, vmax = 1)
+    if self.raster if raster is None else raster:
+      ax = self.paint_axis(ax, picture, view, slice, structure_id, color, ms, fill_alpha, outline_alpha, flipped, level, crop = crop)
+      for s, c in zip(structure_id, color): ax.plot([], [], 'o', c = list(to_rgb(c)), ms = 5, label = label_start + lut.get(s, str(s)))
+    else:
+      outlines = find_structures_and_outlines(picture, structure_id, self.get_outlines(view, slice, level, crop))
+      row, column = self.crop_origin(crop, level)
+      for s, c, m, f, o, fl, (fill, x, y) in zip(structure_id, color, ms, fill_alpha, outline_alpha, flipped, outlines):
+        c = list(to_rgb(c))
+        x, y = self.level_coords(x, level, column), self.level_coords(y, level, row)
+        ax.plot(x, y, 'o', c = c, alpha = o, ms = m)#, label = label_start + lut.get(s, str(s)))
+        ax.plot([], [], 'o', c = c, ms = 5, label = label_start + lut.get(s, str(s)))
+        if f > 0:
+          fill_cmap = LinearSegmentedColormap.from_list('my_cmap', [[0,0,0,0], c+[f]], 2)
+          if fl: ax.imshow(~fill, cmap = fill_cmap, vmin = 0, vmax = 1, extent = self.level_extent(fill, level, crop))
+          else: ax.imshow(fill, cmap = fill_cmap, vmin = 0, vmax = 1, extent = self.level_extent(fill, level, crop))
 
     if plot_legend: ax.legend(labelcolor = 'white', facecolor = 'k', loc = 'upper right', fontsize = fontsize)
     return ax
 
+  def paint(self, layer, view : Literal['Saggittal', 'Axial', 'Coronal'], slice, structure_id, color, fill_alpha = 0.2, outline_alpha = 1, flipped = False, level = 0, scale = 1, width = 1, crop = None):
+    # Blends the fills and then the outlines of each structure into a premultiplied RGBA layer scale times the size of the slice
+    # Fills go first, as imshow puts them under the markers, and outlines are dots width voxels across
+    if type(structure_id) not in [list, np.ndarray]: structure_id = [structure_id]
+    if type(color) not in [list, np.ndarray]: color = [color]
+    if type(fill_alpha) not in [list, np.ndarray]: fill_alpha = [fill_alpha] * len(structure_id)
+    if type(outline_alpha) not in [list, np.ndarray]: outline_alpha = [outline_alpha] * len(structure_id)
+    if type(flipped) not in [list, np.ndarray]: flipped = [flipped] * len(structure_id)
+    if type(width) not in [list, np.ndarray]: width = [width] * len(structure_id)
+    outlines = list(zip(find_structures_and_outlines(self.get_slice(view, slice, level, crop), structure_id, self.get_outlines(view, slice, level, crop)), color, fill_alpha, outline_alpha, flipped, width))
+    for (fill, x, y), c, f, o, fl, w in outlines:
+      if f > 0: blend(layer, upscale(~fill if fl else fill, scale), to_rgb(c), f)
+    for (fill, x, y), c, f, o, fl, w in outlines:
+      if o > 0: blend(layer, outline_mask(layer.shape, x, y, scale, w), to_rgb(c), o)
+    return layer
+
+  def paint_axis(self, ax, picture, view, slice, structure_id, color, ms, fill_alpha, outline_alpha, flipped, level = 0, scale = 2, crop = None):
+    # The raster version of the markers - dots as wide as a marker of size ms would be on this axis, drawn with a single imshow
+    points_per_voxel = ax.bbox.width / ax.figure.dpi * 72 / picture.shape[1]
+    layer = self.paint(new_layer(np.multiply(picture.shape, scale)), view, slice, structure_id, color, fill_alpha, outline_alpha, flipped, level, scale, np.divide(ms, points_per_voxel), crop)
+    ax.imshow(layer_to_uint8(layer, None), interpolation = 'nearest', extent = self.level_extent(picture, level, crop))
+    return ax
+
   def get_mask(self):
-    return self.array.astype(bool).astype(int)
+    return self.array.astype(bool)
   
-  def overlay(self, ax, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slice = 120, structure_id = 0, fontsize = 8, color = 'w', ms = 2, fill_alpha = 0.2, outline_alpha = 1, flipped = False, plot_legend = True):
+  @profiled
+  def overlay(self, ax, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slice = 120, structure_id = 0, fontsize = 8, color = 'w', ms = 2, fill_alpha = 0.2, outline_alpha = 1, flipped = False, plot_legend = True, level = 0, raster = None, crop = None):
     if self.isNone: raise Exception('No segmentation supplied')
-    picture = self.get_slice(view, slice)
+    picture = self.get_slice(view, slice, level, crop)
 
     if type(structure_id) not in [list, np.ndarray]: structure_id = [structure_id]
     if type(color) not in [list, np.ndarray]: color = [color]
+    if type(ms) not in [list, np.ndarray]: ms = [ms] * len(structure_id)
+    if type(fill_alpha) not in [list, np.ndarray]: fill_alpha = [fill_alpha] * len(structure_id)
+    if type(outline_alpha) not in [list, np.ndarray]: outline_alpha = [outline_alpha] * len(structure_id)
+    if type(flipped) not in [list, np.ndarray]: flipped = [flipped] * len(structure_id)
 
-    for s, c, m, f, o, fl in zip(structure_id, color, ms, fill_alpha, outline_alpha, flipped):
-      c = list(to_rgb(c))
-      fill, x, y = find_structure_and_outline(picture, s)
-      ax.plot(x, y, 's', c = c, alpha = o, ms = m, label = lut[s] if s in lut else None)
-      if f > 0:
-        fill_cmap = LinearSegmentedColormap.from_list('my_cmap', [[0,0,0,0], c+[f]], 2)
-        if fl: ax[1].imshow(~fill+2, cmap = fill_cmap, vmin = 0, vmax = 1)
-        else: ax[1].imshow(fill, cmap = fill_cmap, vmin = 0, vmax = 1)
+    if self.raster if raster is None else raster:
+      ax[1] = self.paint_axis(ax[1], picture, view, slice, structure_id, color, ms, fill_alpha, outline_alpha, flipped, level, crop = crop)
+      for s, c, m in zip(structure_id, color, ms): ax[1].plot([], [], 's', c = list(to_rgb(c)), ms = m, label = lut.get(s, str(s)))
+    else:
+      outlines = find_structures_and_outlines(picture, structure_id, self.get_outlines(view, slice, level, crop))
+      row, column = self.crop_origin(crop, level)
+      for s, c, m, f, o, fl, (fill, x, y) in zip(structure_id, color, ms, fill_alpha, outline_alpha, flipped, outlines):
+        c = list(to_rgb(c))
+        x, y = self.level_coords(x, level, column), self.level_coords(y, level, row)
+        ax[1].plot(x, y, 's', c = c, alpha = o, ms = m, label = lut.get(s, str(s)))
+        if f > 0:
+          fill_cmap = LinearSegmentedColormap.from_list('my_cmap', [[0,0,0,0], c+[f]], 2)
+          if fl: ax[1].imshow(~fill, cmap = fill_cmap, vmin = 0, vmax = 1, extent = self.level_extent(fill, level, crop))
+          else: ax[1].imshow(fill, cmap = fill_cmap, vmin = 0, vmax = 1, extent = self.level_extent(fill, level, crop))
 
     if plot_legend and len(structure_id) != 0: ax[1].legend(labelcolor = 'white', facecolor = 'k', markerscale = 2, loc = 'upper right', fontsize = fontsize)
-    structures, counts = np.unique(picture, return_counts=True)
-
-    inds = np.argsort(structures)
-    ax[0].barh([lut[struct] + ' (' + str(struct) + ')' for struct in structures[inds][1:]], counts[inds][1:], height=0.9, align='center', color='r')
-    ax[0].set_title('Relative volumes', c = 'w')
-    ax[0].set_facecolor('black')
-    ax[0].tick_params(axis='x', colors='white')
-    ax[0].tick_params(axis='y', colors='white')
-    ax[0].spines['top'].set_color('white')
-    ax[0].spines['right'].set_color('white')
-    ax[0].spines['bottom'].set_color('white')
-    ax[0].spines['left'].set_color('white')
-    ax[0].set_xticks([])
-    ax[0].yaxis.set_tick_params(labelcolor='white')
+    ax[0] = self.plot_volumes(ax[0], view, slice)
+    return ax
 
+  @profiled
+  def plot_volumes(self, ax, view : Literal['Saggittal', 'Axial', 'Coronal'] = 'Saggittal', slice = 120):
+    counts = self.get_histogram(view)[slice]
+    structures = np.flatnonzero(counts[1:]) + 1
+    ax.barh(self.get_label_names()[structures], counts[structures], height=0.9, align='center', color='r')
+    ax.set_title('Relative volumes', c = 'w')
+    ax.set_facecolor('black')
+    ax.tick_params(axis='x', colors='white')
+    ax.tick_params(axis='y', colors='white')
+    ax.spines['top'].set_color('white')
+    ax.spines['right'].set_color('white')
+    ax.spines['bottom'].set_color('white')
+    ax.spines['left'].set_color('white')
+    ax.set_xticks([])
+    ax.yaxis.set_tick_params(labelcolor='white')
     return ax
\ No newline at end of file
@@ -1,18 +1,19 @@
-import SimpleITK as sitk
 import os
 import numpy as np
+from .volumes import read_volume
+from .Volumetrics import label_counts
 
 class Subject:
   def __init__(self, seg_file, age = 0, gender = 'Unknown'):
     self.seg_file = seg_file
-    seg = sitk.ReadImage(os.path.join(self.seg_file))
-    self.spacing = seg.GetSpacing()
-    self.pixel_vol = seg.GetSizeOfPixelComponent()/1000
-    seg = sitk.GetArrayFromImage(seg)
-    self.total_volume = np.sum(seg.astype(bool).astype(int))*self.pixel_vol
-    structures, counts = np.unique(seg, return_counts = True)
+    seg, info = read_volume(self.seg_file)
+    self.spacing = tuple(info['spacing'])
+    self.pixel_vol = np.prod(self.spacing)/1000
+    counts = label_counts(seg)
+    self.total_volume = np.sum(counts[1:])*self.pixel_vol
+    structures = np.flatnonzero(counts)
     self.vols = dict()
-    counts = counts*self.pixel_vol
+    counts = counts[structures]*self.pixel_vol
     for s, c in zip(structures, counts): self.vols[s] = c
     self.id = os.path.split(self.seg_file)[1][:-4]
     self.age, self.gender = age, gender
@@ -0,0 +1,174 @@
+import numpy as np
+from time import perf_counter
+from threading import Timer, RLock
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal
+from .lazy import lazy_import
+from .profiling import profiled
+from .useful_stuff import *
+from .edges import *
+from .render import *
+
+# Widgets and figures are only imported once a Viewer is made
+matplotlib, plt = lazy_import('matplotlib'), lazy_import('matplotlib.pyplot')
+interact, Dropdown, IntSlider, FloatSlider = lazy_import('ipywidgets', 'interact', 'Dropdown', 'IntSlider', 'FloatSlider')
+display = lazy_import('IPython.display', 'display')
+to_rgb, cnames = lazy_import('matplotlib.colors', 'to_rgb', 'cnames')
+views = ['Saggittal', 'Axial', 'Coronal']
+
+class Viewer():
+  # Interactive figure whose artists are made once and then only have their data swapped as the widgets change
+  def __init__(self, images, mode : Literal['plot', 'overlay', 'compare', 'compare_rgb'] = 'plot', structure_id = [2, 41, 7, 46, 16, 3, 42, 8, 47], c = 'w', ms = 2, fill_alpha = 0.2, outline_alpha = 1, flipped = False, title = None, fontsize = 8, figsize = (5, 5), dpi = 100, pad = -2, prefetch = 2, level = 'auto', preview = 1, refine_after = 0.25):
+    if type(images) not in [list, np.ndarray]: images = [images]
+    if type(c) not in [list, np.ndarray]: c = [c]
+    self.images, self.mode = images, mode
+    self.n = max(len(c)//2, 1) if mode == 'compare_rgb' else len(c)
+    self.structures = (list(structure_id) + [1]*self.n)[:self.n]
+    self.colors = [list(cnames)[i] if col is None else col for i, col in enumerate(c)]
+    self.pick_colors = [i for i, col in enumerate(c) if col is None]
+    self.options = {'ms' : ms, 'fill_alpha' : fill_alpha, 'outline_alpha' : outline_alpha, 'fontsize' : fontsize}
+    self.flipped, self.title = flipped, title
+    self.frame_times = []
+    self.executor, self.pending, self.prefetch = ThreadPoolExecutor(1), None, prefetch
+    self.labels = None
+    self.live = 'ipympl' in matplotlib.get_backend() or matplotlib.get_backend() == 'widget'
+    # While the slider is being dragged frames are drawn `preview` levels coarser, and the last one is redrawn in full once it stops
+    self.level, self.preview, self.refine_after = level, preview, refine_after
+    self.last_update, self.timer, self.lock = 0, None, RLock()
+    self.build(figsize, dpi, pad)
+
+  def build(self, figsize, dpi, pad):
+    ncols = 1 if self.mode in ['plot', 'compare_rgb'] else 2
+    with plt.ioff(): self.fig, ax = plt.subplots(ncols = ncols, figsize = [figsize[0]*ncols, figsize[1]], dpi = dpi)
+    self.fig.patch.set_facecolor('black')
+    self.fig.tight_layout(pad = 0 if ncols == 1 else pad)
+    ax = np.ravel(ax)
+    # Each panel is an axis, the images drawn in it, and the segmentations outlined on top as (segmentation, first colour, colour step, legend prefix)
+    if self.mode == 'plot': self.panels = [[ax[0], self.images[:1], [(self.images[0].seg, 0, 1, '')]]]
+    elif self.mode == 'overlay': self.panels = [[ax[1], self.images[:1], [(self.images[0].seg, 0, 1, '')]]]
+    elif self.mode == 'compare': self.panels = [[a, [image], [(image.seg, 0, 1, '')]] for a, image in zip(ax, self.images[:2])]
+    else: self.panels = [[ax[0], self.images[:2], [(image.seg, i, 2, image.id+' ') for i, image in enumerate(self.images[:2])]]]
+    self.bars = ax[0] if self.mode == 'overlay' else None
+    for panel in self.panels:
+      panel[0].set(yticks = [], xticks = [], frame_on = False)
+      panel.append(None)
+
+  def create_artists(self, panel, shape):
+    ax, images, layers, _ = panel
+    picture = ax.imshow(np.zeros(shape), aspect = 1, cmap = images[0].cmap, vmin = images[0].smallest, vmax = images[0].biggest)
+    outlines = []
+    for seg, start, step, label_start in layers:
+      lines = [ax.plot([], [], 'o' if self.mode != 'overlay' else 's')[0] for i in range(self.n)]
+      proxies = [ax.plot([], [], 'o', ms = 5)[0] for i in range(self.n)]
+      outlines.append((lines, proxies))
+    # All fills in the panel share one RGBA image, which is far quicker to draw than one image per structure
+    fills = ax.imshow(np.zeros(tuple(shape) + (4,)))
+    panel[3] = (picture, outlines, fills)
+
+  def get_picture(self, images, view, slice, level = 0):
+    if len(images) == 1: return images[0].get_slice(view, slice, level)
+    return rgb_compare(images[0].get_slice(view, slice, level), images[1].get_slice(view, slice, level))
+
+  @profiled
+  def update(self, view, slice, refine = False, **controls):
+    with self.lock:
+      start = perf_counter()
+      scrubbing = self.live and not refine and self.preview > 0 and start - self.last_update < self.refine_after
+      self.last_update = start
+      if self.timer is not None: self.timer.cancel()
+      structures = [controls.get(f'structure_{i+1}', s) for i, s in enumerate(self.structures)]
+      colors = [controls.get(f'color_{i+1}', col) for i, col in enumerate(self.colors)]
+      options = {key : controls.get(key, value) for key, value in self.options.items()}
+      labels = []
+
+      for panel in self.panels:
+        ax, images, layers, _ = panel
+        level = images[0].auto_level(view, self.level, ax) + (self.preview if scrubbing else 0)
+        picture = self.get_picture(images, view, slice, level)
+        if panel[3] is None: self.create_artists(panel, picture.shape[:2])
+        image_artist, outlines, fill_artist = panel[3]
+        image_artist.set_data(picture)
+        extent = images[0].level_extent(picture, level)
+        if tuple(image_artist.get_extent()) != extent:
+          for artist in [image_artist, fill_artist]: artist.set_extent(extent)
+          ax.set(xlim = extent[:2], ylim = extent[2:])
+
+        fill_layer = new_layer(picture.shape)
+        for (seg, first, step, label_start), (lines, proxies) in zip(layers, outlines):
+          if seg.isNone: continue
+          labels_picture = seg.get_slice(view, slice, level)
+          found = find_structures_and_outlines(labels_picture, structures, seg.get_outlines(view, slice, level))
+          for i, (s, (fill, x, y)) in enumerate(zip(structures, found)):
+            c = list(to_rgb(colors[(first + i*step) % len(colors)]))
+            lines[i].set_data(seg.level_coords(x, level), seg.level_coords(y, level))
+            lines[i].set(color = c, alpha = options['outline_alpha'], ms = options['ms'])
+            proxies[i].set(color = c, label = label_start + lut.get(s, str(s)))
+            labels.append(proxies[i].get_label())
+            if options['fill_alpha'] > 0: blend(fill_layer, ~fill if self.flipped else fill, c, options['fill_alpha'])
+        fill_artist.set_data(layer_to_rgba(fill_layer))
+
+        if len(images) == 1: label = f'Slice {slice} - {images[0].id} - {images[0].key.capitalize()} - {view}'
+        else: label = f'Slice {slice} - {images[0].id} - {images[1].id} - {view}'
+        ax.set_xlabel(label if self.title is None else self.title, c = 'w', fontsize = options['fontsize'])
+
+      # The legend is the only artist rebuilt, and only when the structures or colours change
+      if labels != self.labels:
+        for panel in self.panels: panel[0].legend(labelcolor = 'white', facecolor = 'k', loc = 'upper right', fontsize = options['fontsize'], markerscale = 2 if self.mode != 'plot' else 1)
+        self.labels = labels
+      if self.bars is not None:
+        self.bars.cla()
+        self.images[0].seg.plot_volumes(self.bars, view, slice)
+
+      self.draw()
+      self.frame_times.append(perf_counter() - start)
+      if scrubbing:
+        self.timer = Timer(self.refine_after, self.update, (view, slice, True), controls)
+        self.timer.start()
+      self.warm(view, slice, level)
+
+  def draw(self):
+    if self.live: self.fig.canvas.draw_idle()
+    else: display(self.fig)
+
+  def warm(self, view, slice, level = 0):
+    # Slices either side of the current one are read and outlined in the background, ready for the next slider move
+    if self.prefetch == 0: return
+    if self.pending is not None: self.pending.cancel()
+    self.pending = self.executor.submit(self.prefetch_slices, view, slice, level)
+
+  def prefetch_slices(self, view, slice, level = 0):
+    for offset in range(1, self.prefetch+1):
+      for s in [slice+offset, slice-offset]:
+        if s < 0 or s >= self.n_slices(view): continue
+        for _, images, layers, _ in self.panels:
+          for image in images: image.get_slice(view, s, level)
+          for seg, _, _, _ in layers:
+            if not seg.isNone: seg.get_outlines(view, s, level)
+
+  def n_slices(self, view):
+    return self.images[0].shape[self.images[0].view_axis(view)]
+
+  def latency(self):
+    # Mean and worst time taken to update the figure, in ms
+    times = np.array(self.frame_times)*1000
+    return (np.mean(times), np.max(times)) if len(times) > 0 else (None, None)
+
+  def controls(self, slice = 100):
+    # Widgets in the same order as the old interact calls, with slice last
+    controls = {'view' : Dropdown(options = views, value = 'Saggittal')}
+    for i, s in enumerate(self.structures):
+      controls[f'structure_{i+1}'] = IntSlider(min = 0, max = 77, step = 1, value = s)
+      if i in self.pick_colors: controls[f'color_{i+1}'] = Dropdown(options = list(cnames), value = self.colors[i])
+    for key, (low, high, step), default in zip(['ms', 'fill_alpha', 'outline_alpha', 'fontsize'], [(0,5,0.1), (0,1,0.01), (0,1,0.01), (4,32,0.1)], [2, 0.2, 1, 8]):
+      if self.options[key] is None:
+        self.options[key] = default
+        controls[key] = FloatSlider(min = low, max = high, step = step, value = default)
+    controls['slice'] = IntSlider(min = 0, max = self.n_slices('Saggittal')-1, step = 1, value = min(slice, self.n_slices('Saggittal')-1))
+    # Volumes needn't be cubes, so the slider's range follows the view
+    controls['view'].observe(lambda change: setattr(controls['slice'], 'max', self.n_slices(change['new'])-1), 'value')
+    return controls
+
+  def show(self, slice = 100):
+    if self.live: display(self.fig.canvas)
+    interact(lambda **controls: self.update(**controls), **self.controls(slice))
+    return self
@@ -0,0 +1,71 @@
+import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
+from .volumes import read_volume
+
+def label_counts(labels):
+  # Voxels per label, indexed by label - much faster than np.unique as nothing needs sorting
+  labels = np.asarray(labels)
+  if labels.dtype.kind not in 'ui': labels = labels.astype(np.int64)
+  if labels.size > 0 and labels.min() < 0: raise ValueError('Labels must be non-negative')
+  return np.bincount(labels.ravel())
+
+def read_label_counts(seg_file):
+  array, info = read_volume(seg_file)
+  # Spacing is in mm, volumes are in cm³
+  return label_counts(array), np.prod(info['spacing'])/1000
+
+class Volumetrics():
+  def __init__(self, source, ids = None, processes = None):
+    if type(source) is str:
+      if source[-4:] != '.npz': raise TypeError(f'Saved volumetrics must be a .npz file, not {source}')
+      self.load(source)
+    else:
+      if hasattr(source, 'kf'):
+        if 'seg' not in source.kf and 'segmentation' not in source.kf: raise Exception('No segmentations labelled in Database')
+        folder = source.kf['seg' if 'seg' in source.kf else 'segmentation']
+        ids, source = list(source.files), [source.find_file(folder, id) for id in source.files]
+      if ids is None: ids = [os.path.split(file)[1][:os.path.split(file)[1].find('.')] for file in source]
+      self.measure(list(source), list(ids), processes)
+
+  def measure(self, files, ids, processes = None):
+    # Segmentations are read and counted in parallel, and each result is written straight into the table
+    self.ids, self.files = np.array(ids, dtype = str), np.array(files, dtype = str)
+    self.counts = np.zeros((len(files), 1), np.int64)
+    self.voxel_volume = np.zeros(len(files))
+    with ProcessPoolExecutor(processes) as pool:
+      for i, (counts, voxel_volume) in enumerate(pool.map(read_label_counts, files, chunksize = 4)):
+        if len(counts) > self.counts.shape[1]: self.counts = np.pad(self.counts, ((0, 0), (0, len(counts)-self.counts.shape[1])))
+        self.counts[i, :len(counts)] = counts
+        self.voxel_volume[i] = voxel_volume
+    self.labels = np.flatnonzero(self.counts.any(0))
+    self.counts = self.counts[:, self.labels]
+
+  @property
+  def volumes(self): return self.counts * self.voxel_volume[:, None]
+
+  @property
+  def total_volume(self): return self.volumes[:, self.labels != 0].sum(1)
+
+  def __getitem__(self, label):
+    # Volume of one label for every subject
+    index = np.searchsorted(self.labels, label)
+    if index == len(self.labels) or self.labels[index] != label: return np.zeros(len(self.ids))
+    return self.volumes[:, index]
+
+  def __len__(self):
+    return len(self.ids)
+
+  def table(self):
+    table = np.zeros(len(self.ids), dtype = [('id', self.ids.dtype), ('file', self.files.dtype), ('voxel_volume', float), ('total_volume', float), ('counts', np.int64, (len(self.labels),)), ('volumes', float, (len(self.labels),))])
+    table['id'], table['file'], table['voxel_volume'] = self.ids, self.files, self.voxel_volume
+    table['total_volume'], table['counts'], table['volumes'] = self.total_volume, self.counts, self.volumes
+    return table
+
+  def save(self, file):
+    np.savez(file, ids = self.ids, files = self.files, labels = self.labels, counts = self.counts, voxel_volume = self.voxel_volume)
+
+  def load(self, file):
+    with np.load(file) as data:
+      self.ids, self.files, self.labels = data['ids'], data['files'], data['labels']
+      self.counts, self.voxel_volume = data['counts'], data['voxel_volume']
@@ -0,0 +1,59 @@
+import numpy as np
+from .profiling import profiled
+
+def find_edges_1D(arr, axis = -1):
+  # A True element is an edge if its neighbour along the axis is False (the ends of the axis don't count)
+  arr = np.asarray(arr).astype(bool)
+  edge_arr = np.zeros_like(arr)
+  a, e = np.moveaxis(arr, axis, -1), np.moveaxis(edge_arr, axis, -1)
+  e[..., 1:] |= a[..., 1:] & ~a[..., :-1]
+  e[..., :-1] |= a[..., :-1] & ~a[..., 1:]
+  return edge_arr
+
+def find_edges_2D(arr):
+  return find_edges_1D(arr, 1) | find_edges_1D(arr, 0)
+
+def find_structure_edges(image, structure_id):
+  return find_edges_2D(image == structure_id)
+
+def find_structure_coords(image, structure_id):
+  y, x = np.where(find_structure_edges(image, structure_id))
+  return x, y
+
+def find_structure_and_outline(image, structure_id):
+  image = image == structure_id
+  y, x = np.where(find_edges_2D(image))
+  return image, x, y
+
+def find_label_edges(image):
+  # Every pixel whose label differs from one of its neighbours, i.e. the edges of all structures at once
+  image = np.asarray(image)
+  edge_arr = np.zeros(image.shape, bool)
+  x_diff = image[:, 1:] != image[:, :-1]
+  edge_arr[:, 1:] |= x_diff
+  edge_arr[:, :-1] |= x_diff
+  y_diff = image[1:] != image[:-1]
+  edge_arr[1:] |= y_diff
+  edge_arr[:-1] |= y_diff
+  return edge_arr
+
+@profiled
+def find_label_outlines(image):
+  # Edge coordinates of every structure in the slice, sorted by label so each structure is a contiguous run
+  image = np.asarray(image)
+  y, x = np.where(find_label_edges(image))
+  labels = image[y, x]
+  order = np.argsort(labels, kind = 'stable')
+  return labels[order], x[order], y[order]
+
+@profiled
+def find_structures_and_outlines(image, structure_ids, outlines = None):
+  # Fill and outline of each structure in one pass over the slice, in the same order as structure_ids
+  image = np.asarray(image)
+  structure_ids = np.ravel(structure_ids)
+  if len(structure_ids) == 0: return []
+  labels, x, y = find_label_outlines(image) if outlines is None else outlines
+  ids, inverse = np.unique(structure_ids, return_inverse = True)
+  start, end = np.searchsorted(labels, ids, 'left'), np.searchsorted(labels, ids, 'right')
+  found = [(image == id, x[a:b], y[a:b]) for id, a, b in zip(ids, start, end)]
+  return [found[i] for i in inverse.ravel()]
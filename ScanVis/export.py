@@ -0,0 +1,75 @@
+import os
+import json
+import argparse
+import warnings
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .Database import *
+
+def output_file(out, id, method, key):
+  return os.path.join(out, f'{id}_{key}_{method}.png')
+
+def is_up_to_date(file, inputs):
+  # An output only needs redrawing if one of the files it was drawn from has changed since
+  return os.path.isfile(file) and os.path.getmtime(file) >= max(os.path.getmtime(input) for input in inputs)
+
+def export_subject(files, id, method, kwargs, out, key = None, force = False):
+  # files are the subject's paths by key, found once in the main process so workers never read or rewrite the Database's index
+  import matplotlib.pyplot as plt
+  plt.switch_backend('Agg')
+  start = perf_counter()
+  inputs = list(files.values())
+  images = open_subject(files, id)
+  key = list(images.keys())[0] if key is None else key
+  file = output_file(out, id, method, key)
+  if not force and is_up_to_date(file, inputs): return {'id' : id, 'file' : file, 'status' : 'skipped', 'time' : perf_counter() - start}
+  kwargs = dict(kwargs)
+  # Methods comparing two images take the other one by key, e.g. {"other" : "seg"}
+  if 'other' in kwargs: kwargs['other'] = images[kwargs['other']]
+  with warnings.catch_warnings():
+    # The methods finish with plt.show(), which Agg warns it can't do
+    warnings.simplefilter('ignore', UserWarning)
+    getattr(images[key], method)(save = file, **kwargs)
+  plt.close('all')
+  return {'id' : id, 'file' : file, 'status' : 'done', 'time' : perf_counter() - start}
+
+def export(database : Database, method, kwargs = None, out = '.', key = None, ids = None, processes = None, force = False):
+  # Draws one figure per subject with any of Image's plotting methods, in parallel and without a display
+  os.makedirs(out, exist_ok = True)
+  ids = database.files if ids is None else ids
+  kwargs = dict() if kwargs is None else kwargs
+  report = []
+  with ProcessPoolExecutor(processes) as pool:
+    futures = dict()
+    for id in ids:
+      try: futures[pool.submit(export_subject, database.subject_files(id), id, method, kwargs, out, key, force)] = id
+      except Exception as error:
+        report.append({'id' : id, 'file' : None, 'status' : f'failed ({error})', 'time' : None})
+        print(f'{len(report)}/{len(ids)} | {id} | {report[-1]["status"]}')
+    for i, future in enumerate(as_completed(futures), len(report)):
+      try: result = future.result()
+      except Exception as error: result = {'id' : futures[future], 'file' : None, 'status' : f'failed ({error})', 'time' : None}
+      report.append(result)
+      print(f'{i+1}/{len(ids)} | {result["id"]} | {result["status"]}' + ('' if result['time'] is None else f' | {result["time"]:.2f}s'))
+  return sorted(report, key = lambda result: result['id'])
+
+def main(args = None):
+  parser = argparse.ArgumentParser(description = 'Export a figure for every subject in a database')
+  parser.add_argument('--folder', action = 'append', required = True, help = 'key=folder, e.g. scan=/data/scans, repeated for each folder')
+  parser.add_argument('--method', required = True, help = 'Image method to draw, e.g. plot_buttloads_of_slices')
+  parser.add_argument('--kwargs', default = '{}', help = 'Keyword arguments for the method as JSON')
+  parser.add_argument('--key', default = None, help = 'Which image of each subject to draw, defaults to the first')
+  parser.add_argument('--out', default = '.', help = 'Folder to save the figures to')
+  parser.add_argument('--ids', nargs = '*', default = None, help = 'Only export these subjects')
+  parser.add_argument('--processes', type = int, default = None)
+  parser.add_argument('--force', action = 'store_true', help = 'Redraw figures that are already up to date')
+  parser.add_argument('--report', default = None, help = 'Save the per-subject timings to this JSON file')
+  args = parser.parse_args(args)
+
+  kf = dict(folder.split('=', 1) for folder in args.folder)
+  report = export(Database(kf = kf), args.method, json.loads(args.kwargs), args.out, args.key, args.ids, args.processes, args.force)
+  if args.report is not None:
+    with open(args.report, 'w') as file: json.dump(report, file, indent = 2)
+  return report
+
+if __name__ == '__main__': main()
@@ -0,0 +1,27 @@
+from importlib import import_module
+
+class LazyObject():
+  # Stands in for a module, or something from one, and only imports it the first time it's actually used
+  def __init__(self, module, name = None):
+    self._module, self._name, self._object = module, name, None
+
+  def _resolve(self):
+    if self._object is None:
+      module = import_module(self._module)
+      self._object = module if self._name is None else getattr(module, self._name)
+    return self._object
+
+  def __getattr__(self, attribute): return getattr(self._resolve(), attribute)
+  def __call__(self, *args, **kwargs): return self._resolve()(*args, **kwargs)
+  def __getitem__(self, key): return self._resolve()[key]
+  def __iter__(self): return iter(self._resolve())
+  def __len__(self): return len(self._resolve())
+  def __contains__(self, item): return item in self._resolve()
+
+  def __repr__(self):
+    return f'<lazy {self._module}{"" if self._name is None else "." + self._name}>'
+
+def lazy_import(module, *names):
+  if len(names) == 0: return LazyObject(module)
+  objects = tuple(LazyObject(module, name) for name in names)
+  return objects[0] if len(objects) == 1 else objects
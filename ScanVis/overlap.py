@@ -0,0 +1,71 @@
+import numpy as np
+from .lazy import lazy_import
+from .profiling import profiled
+from .volumes import read_volume
+
+find_objects, binary_erosion, distance_transform_edt = lazy_import('scipy.ndimage', 'find_objects', 'binary_erosion', 'distance_transform_edt')
+
+@profiled
+def confusion_matrix(first, second, slab = 16):
+  # Voxels with the i-th label in first and the j-th in second at [i, j], with the labels in either, from one bincount of the paired labels a slab of slices at a time
+  # Labels are numbered densely first, so sparse ids like aparc.a2009s's only cost as much as how many labels there are
+  if first.shape != second.shape: raise Exception(f'Segmentations must be the same shape to compare them - {first.shape} and {second.shape}')
+  counts = np.zeros(int(max(first.max(), second.max())) + 1, np.int64)
+  for array in [first, second]:
+    for start in range(0, array.shape[0], slab): counts += np.bincount(array[start:start+slab].astype(np.int64).ravel(), minlength = len(counts))
+  labels = np.flatnonzero(counts)
+  n = len(labels)
+  index = np.zeros(len(counts), np.int64)
+  index[labels] = np.arange(n)
+  matrix = np.zeros(n * n, np.int64)
+  for start in range(0, first.shape[0], slab):
+    pairs = index[first[start:start+slab].astype(np.int64)] * n
+    pairs += index[second[start:start+slab].astype(np.int64)]
+    matrix += np.bincount(pairs.ravel(), minlength = n * n)
+  return matrix.reshape(n, n), labels
+
+def surface_distances(first, second, spacing = (1., 1., 1.)):
+  # Distances from every surface voxel of each mask to the other's surface, in mm
+  # Voxels on the edge of the arrays count as surface, so the masks can be cropped to any box around both of them
+  surfaces = [mask & ~binary_erosion(mask, border_value = 0) for mask in [first, second]]
+  to_second = distance_transform_edt(~surfaces[1], sampling = spacing)[surfaces[0]]
+  to_first = distance_transform_edt(~surfaces[0], sampling = spacing)[surfaces[1]]
+  return to_second, to_first
+
+@profiled
+def overlap_table(first, second, labels = None, spacing = (1., 1., 1.), surface = True):
+  # Dice, Jaccard, volumes and surface distances of every label, as a structured array with one row per label
+  # Volumes are in cm³ like Volumetrics and Cohort, distances in mm - background is never a label, so labels = [0, ...] leaves it out, as are labels in neither segmentation
+  # Every overlap comes from the confusion matrix at once, surface distances need a pass over each label's bounding box
+  matrix, present = confusion_matrix(first, second)
+  labels = present[present > 0] if labels is None else np.array([label for label in labels if label > 0 and np.isin(label, present)], dtype = int)
+  rows = np.searchsorted(present, labels)
+  in_first, in_second, both = matrix.sum(1)[rows], matrix.sum(0)[rows], np.diagonal(matrix)[rows]
+  voxel_volume = np.prod(spacing) / 1000
+  table = np.zeros(len(labels), dtype = [('label', int), ('volume_first', float), ('volume_second', float), ('intersection', float), ('dice', float), ('jaccard', float), ('volume_difference', float), ('relative_volume_difference', float), ('hausdorff', float), ('hausdorff_95', float), ('mean_surface_distance', float)])
+  table['label'] = labels
+  table['volume_first'], table['volume_second'], table['intersection'] = in_first * voxel_volume, in_second * voxel_volume, both * voxel_volume
+  with np.errstate(invalid = 'ignore', divide = 'ignore'):
+    table['dice'] = 2 * both / (in_first + in_second)
+    table['jaccard'] = both / (in_first + in_second - both)
+    table['volume_difference'] = table['volume_second'] - table['volume_first']
+    table['relative_volume_difference'] = table['volume_difference'] / table['volume_first']
+  table['hausdorff'] = table['hausdorff_95'] = table['mean_surface_distance'] = np.nan
+  if surface:
+    # Boxes from both segmentations, so each label is only ever compared inside where it is in either
+    boxes = [find_objects(array if array.dtype.kind in 'ui' else array.astype(np.int64), int(present[-1])) for array in [first, second]]
+    for row, label in enumerate(labels):
+      if in_first[row] == 0 or in_second[row] == 0: continue
+      # Both surfaces are inside the label's combined bounding box, so the distance transforms are exact inside it
+      box = tuple(slice(min(a.start, b.start), max(a.stop, b.stop)) for a, b in zip(boxes[0][label-1], boxes[1][label-1]))
+      to_second, to_first = surface_distances(first[box] == label, second[box] == label, spacing)
+      table['hausdorff'][row] = max(to_second.max(), to_first.max())
+      table['hausdorff_95'][row] = max(np.percentile(to_second, 95), np.percentile(to_first, 95))
+      table['mean_surface_distance'][row] = np.concatenate([to_second, to_first]).mean()
+  return table
+
+def compare_files(first, second, labels = None, surface = True):
+  # Overlap of two segmentation files, using the first one's spacing
+  first, info = read_volume(first)
+  second = read_volume(second)[0]
+  return overlap_table(first, second, labels, tuple(info['spacing'])[::-1], surface)
@@ -0,0 +1,100 @@
+import json
+import threading
+import tracemalloc
+from time import perf_counter
+from functools import wraps
+from contextlib import contextmanager, nullcontext
+
+# The Profile being recorded into, None when profiling is off so decorated functions only pay for one check
+_active = None
+
+class Profile():
+  def __init__(self, memory = True, trace = True):
+    self.memory, self.trace = memory, trace
+    self.stats = dict()
+    self.events = []
+    self.start = perf_counter()
+    self.lock = threading.Lock()
+    self.local = threading.local()
+
+  def record(self, name, start, end, nbytes):
+    with self.lock:
+      calls, time, peak, total = self.stats.get(name, (0, 0., 0, 0))
+      self.stats[name] = (calls + 1, time + end - start, max(peak, nbytes), total + nbytes)
+      if self.trace: self.events.append({'name' : name, 'ph' : 'X', 'ts' : (start - self.start)*1e6, 'dur' : (end - start)*1e6, 'pid' : 0, 'tid' : threading.get_ident(), 'args' : {'bytes' : nbytes}})
+
+  def table(self):
+    # One row per stage, slowest first - times include any stages called inside
+    rows = [{'stage' : name, 'calls' : calls, 'total_ms' : time*1000, 'mean_ms' : time*1000/calls, 'peak_MB' : peak/2**20, 'total_MB' : total/2**20} for name, (calls, time, peak, total) in self.stats.items()]
+    return sorted(rows, key = lambda row: -row['total_ms'])
+
+  def summary(self):
+    lines = [f'{"stage":<45} {"calls":>7} {"total ms":>11} {"mean ms":>10}' + (f' {"peak MB":>9}' if self.memory else '')]
+    for row in self.table():
+      lines.append(f'{row["stage"]:<45} {row["calls"]:>7} {row["total_ms"]:>11.2f} {row["mean_ms"]:>10.3f}' + (f' {row["peak_MB"]:>9.2f}' if self.memory else ''))
+    return '\n'.join(lines)
+
+  def save_trace(self, file):
+    # Opens in chrome://tracing or Perfetto
+    with open(file, 'w') as f: json.dump({'traceEvents' : self.events, 'displayTimeUnit' : 'ms'}, f)
+
+  def __str__(self): return self.summary()
+
+class _Stage():
+  def __init__(self, profile, name):
+    self.profile, self.name = profile, name
+
+  def __enter__(self):
+    if self.profile.memory:
+      # Peaks are tracked as a stack, so a stage nested in another doesn't hide the outer one's high-water mark
+      self.stack = self.profile.local.__dict__.setdefault('stack', [])
+      current, peak = tracemalloc.get_traced_memory()
+      if len(self.stack) > 0: self.stack[-1][1] = max(self.stack[-1][1], peak)
+      tracemalloc.reset_peak()
+      self.stack.append([current, 0])
+    self.start = perf_counter()
+
+  def __exit__(self, *exception):
+    end = perf_counter()
+    nbytes = 0
+    if self.profile.memory:
+      current, peak = tracemalloc.get_traced_memory()
+      base, inner_peak = self.stack.pop()
+      peak = max(peak, inner_peak)
+      nbytes = peak - base
+      if len(self.stack) > 0: self.stack[-1][1] = max(self.stack[-1][1], peak)
+    self.profile.record(self.name, self.start, end, nbytes)
+
+def enable(memory = True, trace = True):
+  # Bytes are the most memory in use above what there was when a stage started, measured with tracemalloc, which slows everything down
+  global _active
+  _active = Profile(memory, trace)
+  if memory and not tracemalloc.is_tracing():
+    tracemalloc.start()
+    _active.started_tracing = True
+  return _active
+
+def disable():
+  global _active
+  profile, _active = _active, None
+  if profile is not None and getattr(profile, 'started_tracing', False): tracemalloc.stop()
+  return profile
+
+@contextmanager
+def profile(memory = True, trace = True):
+  recording = enable(memory, trace)
+  try: yield recording
+  finally: disable()
+
+def timed(name):
+  return nullcontext() if _active is None else _Stage(_active, name)
+
+def profiled(function = None, name = None):
+  # Usable as @profiled or @profiled(name = '...'), the name defaults to Class.method
+  if function is None: return lambda function: profiled(function, name)
+  name = function.__qualname__ if name is None else name
+  @wraps(function)
+  def wrapper(*args, **kwargs):
+    if _active is None: return function(*args, **kwargs)
+    with _Stage(_active, name): return function(*args, **kwargs)
+  return wrapper
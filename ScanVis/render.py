@@ -0,0 +1,60 @@
+import numpy as np
+
+def new_layer(shape):
+  # Premultiplied RGBA, so layers can be painted over each other in any number of steps
+  return np.zeros(tuple(shape[:2]) + (4,))
+
+def blend(layer, mask, color, alpha = 1):
+  # Paints color at opacity alpha over the layer wherever mask is True
+  layer[mask] = np.append(np.multiply(color[:3], alpha), alpha) + layer[mask]*(1-alpha)
+  return layer
+
+def layer_to_rgba(layer):
+  rgba = layer.copy()
+  np.divide(rgba[..., :3], layer[..., 3:], out = rgba[..., :3], where = layer[..., 3:] > 0)
+  return rgba
+
+def colormap_layer(picture, cmap, vmin = None, vmax = None):
+  # The same colours imshow would give, without making a figure
+  vmin = np.min(picture) if vmin is None else vmin
+  vmax = np.max(picture) if vmax is None else vmax
+  layer = np.asarray(cmap(np.clip((picture - vmin) / ((vmax - vmin) or 1), 0, 1)), dtype = float)
+  layer[..., :3] *= layer[..., 3:]
+  return layer
+
+def rgb_compare(picture, other):
+  # Magenta where only the first image is bright, green where only the second is
+  rgb = np.zeros(picture.shape + (3,))
+  rgb[..., 0] = picture
+  rgb[..., 2] = picture
+  rgb[..., 1] = other
+  for i in [0,1,2]: rgb[..., i] /= np.max(rgb[..., i])*2
+  return np.clip(rgb, 0, 1)
+
+def rgb_layer(rgb):
+  return np.concatenate([rgb, np.ones(rgb.shape[:2] + (1,))], axis = -1)
+
+def outline_mask(shape, x, y, scale = 1, width = 1):
+  # Each edge pixel becomes a dot width pixels across, like the markers plot draws, on a grid scale times finer than the slice
+  mask = np.zeros(shape[:2], bool)
+  if scale == 1 and width <= 1:
+    mask[y, x] = True
+    return mask
+  centre, radius = (scale-1)/2, max(width, 1)*scale/2
+  reach = int(np.ceil(radius))
+  for dy in range(-reach, scale+reach):
+    for dx in range(-reach, scale+reach):
+      if (dy-centre)**2 + (dx-centre)**2 > radius**2 + 1e-9: continue
+      yy, xx = y*scale + dy, x*scale + dx
+      inside = (yy >= 0) & (yy < shape[0]) & (xx >= 0) & (xx < shape[1])
+      mask[yy[inside], xx[inside]] = True
+  return mask
+
+def upscale(mask, scale = 1):
+  return mask if scale == 1 else np.repeat(np.repeat(mask, scale, 0), scale, 1)
+
+def layer_to_uint8(layer, background = (0, 0, 0)):
+  # Flattened onto an opaque background, or kept transparent if background is None
+  if background is None: return np.round(layer_to_rgba(layer) * 255).astype(np.uint8)
+  rgb = layer[..., :3] + np.multiply(background[:3], 1 - layer[..., 3:])
+  return np.round(np.concatenate([rgb, np.ones(rgb.shape[:2] + (1,))], axis = -1) * 255).astype(np.uint8)
@@ -0,0 +1,284 @@
+import os
+import json
+import string
+import hashlib
+import argparse
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote
+from .Database import *
+from .volumes import volume_key, read_header
+from .lazy import lazy_import
+import numpy as np
+
+PIL_Image = lazy_import('PIL.Image')
+
+views = ['Saggittal', 'Axial', 'Coronal']
+# The array axis each view's slices are taken along, as in Array3D.view_axis
+view_axes = {'Saggittal' : 2, 'Axial' : 1, 'Coronal' : 0}
+colors = ['red', 'lime', 'blue', 'yellow', 'cyan', 'magenta', 'orange', 'white']
+
+def encode_png(rgba, compression = 1):
+  # RGBA uint8 to PNG - low compression levels are enough for the flat areas of a slice, and much quicker
+  png = BytesIO()
+  PIL_Image.fromarray(np.ascontiguousarray(rgba)).save(png, 'PNG', compress_level = compression)
+  return png.getvalue()
+
+class TileCache():
+  # Rendered tiles by key - the most recent in memory, and every one in a folder if there is one, each dropping the least recently used once past its size
+  def __init__(self, folder = None, memory_bytes = 2**28, disk_bytes = 2**31):
+    self.folder, self.memory_bytes, self.disk_bytes = folder, memory_bytes, disk_bytes
+    self.memory, self.memory_used, self.disk_used = OrderedDict(), 0, 0
+    self.hits, self.disk_hits, self.misses = 0, 0, 0
+    self.lock = threading.Lock()
+    if self.folder is not None:
+      os.makedirs(self.folder, exist_ok = True)
+      self.disk_used = sum(file.stat().st_size for file in os.scandir(self.folder) if file.name[-4:] == '.png')
+
+  def get(self, key):
+    with self.lock:
+      if key in self.memory:
+        self.hits += 1
+        self.memory.move_to_end(key)
+        return self.memory[key]
+    if self.folder is not None:
+      file = os.path.join(self.folder, key + '.png')
+      try:
+        with open(file, 'rb') as f: data = f.read()
+        # A tile's modification time is when it was last used
+        os.utime(file)
+        with self.lock:
+          self.disk_hits += 1
+          self.remember(key, data)
+        return data
+      except OSError: pass
+    with self.lock: self.misses += 1
+    return None
+
+  def put(self, key, data):
+    with self.lock: self.remember(key, data)
+    if self.folder is None: return
+    file = os.path.join(self.folder, key + '.png')
+    # A tile written again replaces the old one, so only the difference in size is added
+    try: replaced = os.stat(file).st_size
+    except OSError: replaced = 0
+    try:
+      with open(f'{file}.{threading.get_ident()}.tmp', 'wb') as f: f.write(data)
+      os.replace(f'{file}.{threading.get_ident()}.tmp', file)
+    except OSError: return
+    with self.lock:
+      self.disk_used += len(data) - replaced
+      full = self.disk_used > self.disk_bytes
+    if full: self.trim_disk()
+
+  def remember(self, key, data):
+    if key in self.memory: self.memory_used -= len(self.memory.pop(key))
+    self.memory[key] = data
+    self.memory_used += len(data)
+    while self.memory_used > self.memory_bytes and len(self.memory) > 1: self.memory_used -= len(self.memory.popitem(last = False)[1])
+
+  def trim_disk(self):
+    # Down to 90% of the limit, so the folder isn't listed again on every tile
+    with self.lock:
+      tiles = sorted((file.stat().st_mtime_ns, file.stat().st_size, file.path) for file in os.scandir(self.folder) if file.name[-4:] == '.png')
+      used = sum(size for _, size, _ in tiles)
+      for _, size, file in tiles:
+        if used <= 0.9 * self.disk_bytes: break
+        try: os.remove(file)
+        except OSError: continue
+        used -= size
+      self.disk_used = used
+
+  def info(self):
+    return {'hits' : self.hits, 'disk_hits' : self.disk_hits, 'misses' : self.misses, 'tiles' : len(self.memory), 'memory_bytes' : self.memory_used, 'disk_bytes' : self.disk_used}
+
+class TileServer(ThreadingHTTPServer):
+  # Serves every subject of a Database to a browser as PNG slices, each request on its own thread
+  daemon_threads = True
+
+  def __init__(self, database : Database, address = ('127.0.0.1', 8000), cache : TileCache = None, verbose = False):
+    super().__init__(address, TileHandler)
+    self.database = database
+    self.cache = TileCache() if cache is None else cache
+    self.verbose = verbose
+    self.lock = threading.Lock()
+    self.headers, self.loading = dict(), dict()
+
+  def subject(self, id):
+    # Database isn't thread safe, so it's only used under the server's lock - the files are read under a lock for each subject instead
+    # so threads never decode the same volume at the same time, but one subject loading doesn't hold up tiles of the others
+    with self.lock:
+      subject = self.database.load(id)
+      lock = self.loading.setdefault(id, threading.Lock())
+    with lock: return subject.load()
+
+  def keys(self):
+    # Image key -> Database key of the file it's read from, for every subject without loading one - a Scan adds brain and calls its segmentation seg
+    kf = self.database.kf
+    seg_key = 'seg' if 'seg' in kf else 'segmentation' if 'segmentation' in kf else None
+    if 'scan' in kf and seg_key is not None: return {'scan' : 'scan', 'brain' : 'scan', 'seg' : seg_key}
+    return {key : key for key in kf if key != seg_key}
+
+  def shape(self, id, key):
+    # From the file's header, so a request can be checked before any voxels are read
+    file = self.database.find_file(self.database.kf[self.keys()[key]], id)
+    header_key = volume_key(file)
+    if header_key not in self.headers: self.headers[header_key] = tuple(read_header(file)['shape'])
+    return self.headers[header_key]
+
+  def fingerprint(self, id):
+    # Any change to one of the subject's files changes the keys of all its tiles
+    return [volume_key(self.database.find_file(folder, id)) for folder in self.database.kf.values()]
+
+  def info(self, id):
+    # Shapes come from the headers and labels from the segmentation alone, so none of the other files are read
+    with self.lock:
+      subject = self.database.load(id)
+      lock = self.loading.setdefault(id, threading.Lock())
+    shape = self.shape(id, next(iter(self.keys())))
+    info = {'id' : id, 'keys' : list(subject.keys()), 'shape' : list(shape), 'slices' : {view : int(shape[view_axes[view]]) for view in views}}
+    seg = next(iter(subject.values())).seg
+    if not seg.isNone:
+      with lock: boxes = seg.get_boxes()
+      info['labels'] = {int(label) : lut.get(int(label), str(label)) for label in np.flatnonzero(boxes[:, 0, 0] >= 0) if label != 0}
+    return info
+
+  def tile(self, id, key, view, slice, query):
+    # Cached tiles are found from the subject's file stats alone, the subject is only loaded to draw a new one
+    # Colours are names or hex without the #, which can't go in a URL
+    structure_id = [int(s) for s in query.get('structures', '').split(',') if s != '']
+    c = ['#' + color if len(color) == 6 and all(char in string.hexdigits for char in color) else color for color in query.get('colors', '').split(',') if color != ''] or colors
+    fill_alpha, outline_alpha, level = float(query.get('fill', 0.2)), float(query.get('outline', 1)), int(query.get('level', 0))
+    focus, margin = query.get('focus'), int(query.get('margin', 10))
+    if focus is not None: focus = [int(s) for s in focus.split(',') if s != '']
+    cache_key = hashlib.md5(json.dumps([self.fingerprint(id), key, view, slice, structure_id, c, fill_alpha, outline_alpha, level, focus, margin]).encode()).hexdigest()
+    png = self.cache.get(cache_key)
+    if png is not None: return png
+    image = self.subject(id)[key]
+    crop = None
+    if focus is not None:
+      if image.seg.isNone: raise ValueError(f'{key} has no segmentation to focus on')
+      boxes = image.seg.get_boxes()
+      if not any(0 < s < len(boxes) and boxes[s, 0, 0] >= 0 for s in focus): raise LookupError(f'Structure {focus} not in {id}')
+      crop = image.seg.get_box(view, focus, margin)
+    png = encode_png(image.render_slice(view, slice, structure_id, None, c, fill_alpha, outline_alpha, False, level, 'k', crop))
+    self.cache.put(cache_key, png)
+    return png
+
+class TileHandler(BaseHTTPRequestHandler):
+  # GET /                                      a page for browsing the database
+  #     /subjects                              every subject ID and image key
+  #     /subjects/<id>                         shape, slices per view and labels of one subject
+  #     /tiles/<id>/<key>/<view>/<slice>.png   a slice, with ?structures=17,53&colors=red,00ff00&fill=0.2&outline=1&level=0&focus=17&margin=10
+  #     /stats                                 tile and subject cache counters
+  def do_GET(self):
+    url = urlparse(self.path)
+    parts = [unquote(part) for part in url.path.strip('/').split('/') if part != '']
+    query = {key : values[-1] for key, values in parse_qs(url.query).items()}
+    server = self.server
+    try:
+      if len(parts) == 0: return self.send(200, 'text/html; charset=utf-8', page.encode())
+      if parts == ['subjects']: return self.send_json({'ids' : server.database.files, 'keys' : list(server.database.kf)})
+      if parts == ['stats']:
+        with server.lock: subjects = server.database.cache_info()
+        return self.send_json({'tiles' : server.cache.info(), 'subjects' : subjects})
+      if len(parts) == 2 and parts[0] == 'subjects':
+        if parts[1] not in server.database.dictionary: return self.send_json({'error' : f'No subject {parts[1]}'}, 404)
+        return self.send_json(server.info(parts[1]))
+      if len(parts) == 5 and parts[0] == 'tiles' and parts[4][-4:] == '.png':
+        id, key, view, slice = parts[1], parts[2], parts[3], parts[4][:-4]
+        if id not in server.database.dictionary: return self.send_json({'error' : f'No subject {id}'}, 404)
+        if view not in views: return self.send_json({'error' : f'View must be one of {views}'}, 404)
+        if not slice.isdigit(): return self.send_json({'error' : f'Slice must be a whole number, not {slice}'}, 400)
+        if key not in server.keys(): return self.send_json({'error' : f'No image {key} for {id}'}, 404)
+        slice = int(slice)
+        if slice >= server.shape(id, key)[view_axes[view]]: return self.send_json({'error' : f'Slice {slice} is past the end of {view}'}, 404)
+        # The coarsest level still has a voxel along the shortest axis, as in Array3D.auto_level
+        level, top = query.get('level', '0'), int(np.log2(min(server.shape(id, key))))
+        if not (level.isdecimal() and int(level) <= top): return self.send_json({'error' : f'Level must be a whole number from 0 to {top}, not {level}'}, 400)
+        return self.send(200, 'image/png', server.tile(id, key, view, slice, query), cache = True)
+      return self.send_json({'error' : f'Nothing at {url.path}'}, 404)
+    except (ValueError, KeyError) as error: return self.send_json({'error' : str(error)}, 400)
+    # Asking to focus on a structure the subject doesn't have
+    except LookupError as error: return self.send_json({'error' : str(error)}, 404)
+    except Exception as error: return self.send_json({'error' : str(error)}, 500)
+
+  def send(self, status, content_type, body, cache = False):
+    self.send_response(status)
+    self.send_header('Content-Type', content_type)
+    self.send_header('Content-Length', str(len(body)))
+    # Tiles change key whenever their files do, so browsers can keep them
+    if cache: self.send_header('Cache-Control', 'max-age=86400')
+    self.end_headers()
+    self.wfile.write(body)
+
+  def send_json(self, value, status = 200):
+    self.send(status, 'application/json', json.dumps(value).encode())
+
+  def log_message(self, format, *args):
+    if self.server.verbose: super().log_message(format, *args)
+
+def serve(database : Database, host = '127.0.0.1', port = 8000, folder = None, memory_bytes = 2**28, disk_bytes = 2**31, verbose = False):
+  # Blocks until interrupted, tiles are kept in folder (<cache>/tiles by default) unless folder is False
+  folder = os.path.join(cache_folder, 'tiles') if folder is None else None if folder is False else folder
+  server = TileServer(database, (host, port), TileCache(folder, memory_bytes, disk_bytes), verbose)
+  print(f'Serving {len(database.files)} subjects on http://{host}:{server.server_address[1]}/')
+  try: server.serve_forever()
+  except KeyboardInterrupt: pass
+  finally: server.server_close()
+  return server
+
+# The browser side - slides through slices, asking for the next few ahead of time so they're already cached
+page = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>ScanVis</title>
+<style>body{background:#000;color:#ddd;font:13px sans-serif;margin:12px} select,input{background:#222;color:#ddd;border:1px solid #444;margin-right:8px} img{image-rendering:pixelated;height:75vh;display:block;margin-top:10px}</style></head>
+<body>
+<select id="id"></select><select id="key"></select><select id="view"><option>Saggittal</option><option>Axial</option><option>Coronal</option></select>
+<input id="slice" type="range" min="0" value="0" style="width:40%"><span id="number"></span>
+structures <input id="structures" placeholder="2,41,17,53" size="14"> focus <input id="focus" size="4">
+<img id="tile">
+<script>
+const $ = id => document.getElementById(id);
+let info = null;
+const url = s => `tiles/${$('id').value}/${$('key').value}/${$('view').value}/${s}.png?structures=${$('structures').value}` + ($('focus').value ? `&focus=${$('focus').value}` : '');
+function draw() {
+  const s = Number($('slice').value);
+  $('number').textContent = s;
+  $('tile').src = url(s);
+  for (const d of [1, 2, -1, 3]) if (s + d >= 0 && s + d <= Number($('slice').max)) new Image().src = url(s + d);
+}
+async function load() {
+  info = await (await fetch(`subjects/${$('id').value}`)).json();
+  $('key').innerHTML = info.keys.map(k => `<option>${k}</option>`).join('');
+  view();
+}
+function view() {
+  $('slice').max = info.slices[$('view').value] - 1;
+  $('slice').value = Math.floor(info.slices[$('view').value] / 2);
+  draw();
+}
+fetch('subjects').then(r => r.json()).then(d => { $('id').innerHTML = d.ids.map(i => `<option>${i}</option>`).join(''); load(); });
+$('id').onchange = load; $('view').onchange = view; $('slice').oninput = draw;
+$('key').onchange = $('structures').onchange = $('focus').onchange = draw;
+</script></body></html>'''
+
+def main(args = None):
+  parser = argparse.ArgumentParser(description = 'Serve the slices of every subject in a database to a browser')
+  parser.add_argument('--folder', action = 'append', required = True, help = 'key=folder, e.g. scan=/data/scans, repeated for each folder')
+  parser.add_argument('--host', default = '127.0.0.1')
+  parser.add_argument('--port', type = int, default = 8000)
+  parser.add_argument('--cache', default = None, help = 'Folder to keep rendered tiles in, defaults to <SCANVIS_CACHE>/tiles')
+  parser.add_argument('--no-disk-cache', action = 'store_true', help = 'Only keep tiles in memory')
+  parser.add_argument('--memory-mb', type = float, default = 256, help = 'Memory for rendered tiles')
+  parser.add_argument('--disk-mb', type = float, default = 2048, help = 'Disk space for rendered tiles')
+  parser.add_argument('--subject-mb', type = float, default = 4096, help = 'Memory for loaded subjects')
+  parser.add_argument('--verbose', action = 'store_true', help = 'Log every request')
+  args = parser.parse_args(args)
+
+  kf = dict(folder.split('=', 1) for folder in args.folder)
+  database = Database(kf = kf, memory_limit = int(args.subject_mb * 2**20))
+  return serve(database, args.host, args.port, False if args.no_disk_cache else args.cache, int(args.memory_mb * 2**20), int(args.disk_mb * 2**20), args.verbose)
+
+if __name__ == '__main__': main()
@@ -0,0 +1,54 @@
+import os
+import numpy as np
+from .lazy import lazy_import
+
+PIL_Image, GifImagePlugin = lazy_import('PIL.Image'), lazy_import('PIL.GifImagePlugin')
+open_memmap = lazy_import('numpy.lib.format', 'open_memmap')
+
+# Each writer takes frames one at a time and keeps none of them, so memory doesn't grow with the number of slices
+
+def write_gif(frames, file, fps = 10, loop = 0):
+  # Pillow's save_all holds every frame until the end, so the file is written frame by frame with GifImagePlugin's getheader and getdata instead
+  # Every frame gets its own colour table, as one palette can't cover every slice
+  duration = int(round(1000 / fps))
+  images = (PIL_Image.fromarray(np.ascontiguousarray(frame[..., :3])).quantize(256) for frame in frames)
+  image = next(images, None)
+  # A GIF needs at least one frame, so nothing is written without one
+  if image is None: raise Exception(f'No frames to write to {file}')
+  count = 0
+  with open(file, 'wb') as fp:
+    for chunk in GifImagePlugin.getheader(image, info = {'loop' : loop})[0]: fp.write(chunk)
+    while image is not None:
+      for chunk in GifImagePlugin.getdata(image, duration = duration, include_color_table = True): fp.write(chunk)
+      count += 1
+      image = next(images, None)
+    fp.write(b';')
+  return count
+
+def write_npy(frames, file, n_frames):
+  # Frames go straight into a memory mapped (n_frames, height, width, 4) array on disk
+  array, count = None, 0
+  for frame in frames:
+    if array is None: array = open_memmap(file, mode = 'w+', dtype = np.uint8, shape = (n_frames,) + frame.shape)
+    array[count] = frame
+    count += 1
+  if array is not None: array.flush()
+  return count
+
+def write_pngs(frames, file, names):
+  # file is either a folder, or a pattern like 'sweep/{:03d}.png' filled in with each name
+  if '{' not in file:
+    os.makedirs(file, exist_ok = True)
+    file = os.path.join(file, '{:03d}.png')
+  else: os.makedirs(os.path.dirname(file) or '.', exist_ok = True)
+  count = 0
+  for frame, name in zip(frames, names):
+    PIL_Image.fromarray(frame).save(file.format(name))
+    count += 1
+  return count
+
+def write_frames(frames, file, names, fps = 10):
+  names = list(names)
+  if file[-4:] == '.gif': return write_gif(frames, file, fps)
+  if file[-4:] == '.npy': return write_npy(frames, file, len(names))
+  return write_pngs(frames, file, names)
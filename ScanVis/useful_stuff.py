@@ -1,54 +1,83 @@
 import numpy as np
+import os
+import pickle
+import hashlib
+from collections.abc import Mapping
+from .edges import *
 
 pop = '/Users/work/Desktop/MPhys/popty-ping/'
 mphys = '/Users/work/Desktop/MPhys/'
 labbook = '/Users/work/Desktop/MPhys/images_for_lab_book/'
 
-with open('/Users/work/Desktop/Code/MPhys/LUT.txt', 'r') as file: lines = file.readlines()
-lut = dict()
-rlut = dict()
-for line in lines:
-  if line[0].isdigit():
-    line = [word for word in line.split() if word != ' ']
-    lut[int(line[0])] = line[1]
-    rlut[line[1]] = int(line[0])
-
-info_data = '/Users/work/Desktop/MPhys/freesvol01.txt'
-
-with open(info_data, 'r') as file: lines = file.readlines()
-
-patient_dict = dict()
-for line in lines[2:]:
-  line = line.split('\t')
-  patient_dict[line[4][1:-1]] = [int(line[7][1:-1]), line[8][1:-1]]
-
-def find_edges_1D(arr):
-  string_arr = ''.join(arr.astype(int).astype(str))
-  edge_arr = string_arr.replace('01', '02').replace('10', '20') # Turn any True by a False to a 2
-  edge_arr = (np.array(list(edge_arr)).astype(int) - 2).astype(bool)
-  return ~edge_arr
-
-def find_edges_2D(arr):
-  x_arr = np.array([find_edges_1D(line) for line in arr])
-  y_arr = np.swapaxes(np.array([find_edges_1D(line) for line in np.swapaxes(arr, 0, 1)]),0,1)
-  edge_arr = x_arr | y_arr
-  return edge_arr
-
-def find_structure_edges(image, structure_id):
-  image = ~(image - structure_id).astype(bool)
-  image = find_edges_2D(image)
-  return image
-
-def find_structure_coords(image, structure_id):
-  image = find_structure_edges(image, structure_id)
-  y, x = np.where(image)
-  return x, y
-
-def find_structure_and_outline(image, structure_id):
-  image = ~(image - structure_id).astype(bool)
-  edges = find_edges_2D(image)
-  y, x = np.where(edges)
-  return image, x, y
+info_data = mphys + 'freesvol01.txt'
+
+# Where the FreeSurfer lookup table and patient table are read from, set with set_lut_file and set_patient_file or the environment
+table_files = {'lut' : os.environ.get('SCANVIS_LUT', '/Users/work/Desktop/Code/MPhys/LUT.txt'), 'patients' : os.environ.get('SCANVIS_PATIENTS', info_data)}
+cache_folder = os.environ.get('SCANVIS_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'scanvis'))
+
+def read_lut(file):
+  lut = dict()
+  with open(file, 'r') as f: lines = f.readlines()
+  for line in lines:
+    if line[0].isdigit():
+      line = [word for word in line.split() if word != ' ']
+      lut[int(line[0])] = line[1]
+  return lut
+
+def read_patients(file):
+  patient_dict = dict()
+  with open(file, 'r') as f: lines = f.readlines()
+  for line in lines[2:]:
+    line = line.split('\t')
+    patient_dict[line[4][1:-1]] = [int(line[7][1:-1]), line[8][1:-1]]
+  return patient_dict
+
+def read_cached(file, read):
+  # Each version of a table is only parsed once, after that it's unpickled from the cache folder
+  # A missing table is empty rather than an error, so labels are drawn by number on machines without FreeSurfer's files
+  if not os.path.isfile(file):
+    print(f'Warning : {file} not found, so {read.__name__[5:]} is empty - set where it is with set_lut_file / set_patient_file or SCANVIS_LUT / SCANVIS_PATIENTS')
+    return dict()
+  stat = os.stat(file)
+  name = hashlib.md5(f'{os.path.abspath(file)}|{stat.st_mtime_ns}|{stat.st_size}'.encode()).hexdigest()
+  cache = os.path.join(cache_folder, f'{read.__name__}_{name}.pkl')
+  if os.path.isfile(cache):
+    with open(cache, 'rb') as f: return pickle.load(f)
+  table = read(file)
+  try:
+    os.makedirs(cache_folder, exist_ok = True)
+    with open(cache + '.tmp', 'wb') as f: pickle.dump(table, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(cache + '.tmp', cache)
+  except OSError: pass
+  return table
+
+class LazyTable(Mapping):
+  # A dictionary that isn't filled until it's first looked in
+  def __init__(self, load):
+    self.load, self.table = load, None
+
+  def get_table(self):
+    if self.table is None: self.table = self.load()
+    return self.table
+
+  def reset(self): self.table = None
+  def __getitem__(self, key): return self.get_table()[key]
+  def __contains__(self, key): return key in self.get_table()
+  def __iter__(self): return iter(self.get_table())
+  def __len__(self): return len(self.get_table())
+
+lut = LazyTable(lambda: read_cached(table_files['lut'], read_lut))
+rlut = LazyTable(lambda: {name : id for id, name in lut.items()})
+patient_dict = LazyTable(lambda: read_cached(table_files['patients'], read_patients))
+
+def set_lut_file(file):
+  table_files['lut'] = file
+  lut.reset()
+  rlut.reset()
+
+def set_patient_file(file):
+  table_files['patients'] = file
+  patient_dict.reset()
 
 def print_color(color):
   if type(color) is str: return f'\'{color}\''
@@ -0,0 +1,106 @@
+import numpy as np
+import os
+import json
+import hashlib
+from weakref import WeakValueDictionary
+from .lazy import lazy_import
+from .profiling import profiled
+from .useful_stuff import cache_folder
+
+sitk = lazy_import('SimpleITK')
+
+# Every volume currently in use, keyed by file, so opening the same file twice shares one buffer
+_volumes = WeakValueDictionary()
+
+# Decoded volumes can be kept on disk as .npy files, so the next session memory maps them instead of decompressing them again
+# Off unless a folder is given with enable_volume_cache or SCANVIS_VOLUME_CACHE, and capped at max_bytes with the least recently used removed first
+volume_cache = {'folder' : os.environ.get('SCANVIS_VOLUME_CACHE'), 'max_bytes' : int(os.environ.get('SCANVIS_VOLUME_CACHE_BYTES', 2**34))}
+
+def volume_key(path):
+  stat = os.stat(path)
+  return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+def enable_volume_cache(folder = None, max_bytes = 2**34):
+  volume_cache['folder'] = os.path.join(cache_folder, 'volumes') if folder is None else folder
+  volume_cache['max_bytes'] = max_bytes
+  return volume_cache['folder']
+
+def disable_volume_cache():
+  volume_cache['folder'] = None
+
+def cached_volume(path):
+  # Where a file's decoded volume goes, named after its path, modification time and size so any change to it is a new entry
+  name = hashlib.md5('|'.join(str(part) for part in volume_key(path)).encode()).hexdigest()
+  return os.path.join(volume_cache['folder'], name)
+
+def read_cached_volume(entry):
+  try:
+    with open(entry + '.json', 'r') as file: info = json.load(file)
+    array = np.load(entry + '.npy', mmap_mode = 'r')
+  except (OSError, ValueError): return None, None
+  # The metadata's modification time is when the entry was last used
+  try: os.utime(entry + '.json')
+  except OSError: pass
+  return array, info
+
+def write_cached_volume(entry, array, info):
+  try:
+    os.makedirs(volume_cache['folder'], exist_ok = True)
+    temporary = f'{entry}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as file: np.save(file, array)
+    os.replace(temporary, entry + '.npy')
+    with open(temporary, 'w') as file: json.dump(info, file)
+    os.replace(temporary, entry + '.json')
+    trim_volume_cache()
+  except OSError: pass
+
+def trim_volume_cache(max_bytes = None):
+  # Removes the least recently used volumes until the cache fits in max_bytes
+  max_bytes = volume_cache['max_bytes'] if max_bytes is None else max_bytes
+  entries = []
+  for file in os.scandir(volume_cache['folder']):
+    if file.name[-4:] != '.npy': continue
+    entry = file.path[:-4]
+    try: used = os.stat(entry + '.json').st_mtime_ns
+    except OSError: used = 0
+    entries.append((used, file.stat().st_size, entry))
+  total = sum(size for used, size, entry in entries)
+  for used, size, entry in sorted(entries):
+    if total <= max_bytes: break
+    for extension in ['.npy', '.json']:
+      try: os.remove(entry + extension)
+      except OSError: pass
+    total -= size
+
+@profiled
+def read_volume(path):
+  # The voxels and SimpleITK's (x, y, z) spacing, origin and direction, from the volume cache if it's on
+  if path[-4:] == '.npy': return np.load(path, mmap_mode = 'r'), {'spacing' : (1., 1., 1.), 'origin' : (0., 0., 0.), 'direction' : (1., 0., 0., 0., 1., 0., 0., 0., 1.)}
+  if volume_cache['folder'] is not None:
+    entry = cached_volume(path)
+    array, info = read_cached_volume(entry)
+    if array is not None: return array, info
+  image = sitk.ReadImage(path)
+  array = sitk.GetArrayFromImage(image)
+  info = {'spacing' : image.GetSpacing(), 'origin' : image.GetOrigin(), 'direction' : image.GetDirection()}
+  if volume_cache['folder'] is not None: write_cached_volume(entry, array, dict(info, source = os.path.abspath(path)))
+  return array, info
+
+@profiled
+def read_header(path):
+  if path[-4:] == '.npy':
+    array = open_volume(path)
+    return {'shape' : array.shape, 'dtype' : array.dtype, 'spacing' : (1., 1., 1.)}
+  reader = sitk.ImageFileReader()
+  reader.SetFileName(path)
+  reader.ReadImageInformation()
+  # SimpleITK sizes and spacings are (x, y, z), arrays are indexed [z, y, x]
+  return {'shape' : reader.GetSize()[::-1], 'dtype' : None, 'spacing' : reader.GetSpacing()[::-1]}
+
+@profiled
+def open_volume(path):
+  key = volume_key(path)
+  array = _volumes.get(key)
+  if array is None:
+    array = _volumes[key] = read_volume(path)[0]
+  return array
@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+import argparse
+import platform
+import tempfile
+from time import perf_counter, strftime
+import numpy as np
+
+# Benchmarks the ScanVis in this tree rather than any installed copy
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from synthetic import *
+from ScanVis.Image import Image
+from ScanVis.Segmentation import Segmentation
+from ScanVis.Array3D import Array3D
+from ScanVis.Database import Database, index_path
+from ScanVis.Subject import Subject
+from ScanVis.edges import find_edges_2D, find_structure_and_outline
+
+views = ['Saggittal', 'Axial', 'Coronal']
+# Every stage is name -> (timed function, untimed setup), both given the shared data dictionary
+stages = dict()
+
+def stage(name, setup = None):
+  def register(function):
+    stages[name] = (function, setup)
+    return function
+  return register
+
+def measure(function, setup, data, repeats):
+  times = []
+  for _ in range(repeats):
+    if setup is not None: setup(data)
+    start = perf_counter()
+    function(data)
+    times.append(perf_counter() - start)
+  times = np.array(times)*1000
+  return {'median_ms' : float(np.median(times)), 'min_ms' : float(times.min()), 'mean_ms' : float(times.mean()), 'repeats' : repeats}
+
+def prepare(folder, shape, subjects, subject_shape):
+  data = {'files' : synthetic_volumes(os.path.join(folder, 'volumes'), shape)}
+  data['kf'] = synthetic_database(os.path.join(folder, 'database'), subjects, subject_shape)
+  labels = np.load(data['files']['seg.npy'])
+  data['seg'] = Segmentation(labels)
+  data['image'] = Image('scan', np.load(data['files']['scan.npy']), data['seg'])
+  data['ids'] = sorted(np.unique(labels)[1:].tolist())
+  data['middle'] = {view : int(np.mean(data['seg'].get_extent(view))) for view in views}
+  data['slices'] = {view : [s for s in range(data['middle'][view]-32, data['middle'][view]+32) if 0 <= s < data['seg'].shape[data['seg'].view_axis(view)]] for view in views}
+  data['label_slice'] = data['seg'].get_slice('Axial', data['middle']['Axial'])
+  return data
+
+def close_figures(data): plt.close('all')
+
+# Loading
+for extension in ['.nii', '.npy']:
+  stage(f'load scan{extension}')(lambda data, extension = extension: Array3D(data['files']['scan' + extension], lazy = False))
+  stage(f'load seg{extension}')(lambda data, extension = extension: Segmentation(data['files']['seg' + extension], lazy = False))
+
+# Slicing, with nothing cached so every slice is read again
+def clear_cache(data): data['image'].cache.clear()
+for view in views:
+  stage(f'get_slice {view} x64', clear_cache)(lambda data, view = view: [np.ascontiguousarray(data['image'].get_slice(view, s)) for s in data['slices'][view]])
+
+def clear_extents(data): data['seg'].extents = dict()
+for view in views: stage(f'get_slices {view}', clear_extents)(lambda data, view = view: data['seg'].get_slices(view, 5, [10, 10]))
+
+# Outlines
+stage('find_edges_2D')(lambda data: find_edges_2D(data['label_slice'] == data['ids'][0]))
+stage('find_structure_and_outline')(lambda data: find_structure_and_outline(data['label_slice'], data['ids'][0]))
+
+# Drawing, on Agg and including the canvas draw so matplotlib's time is counted too
+def new_axis(data):
+  plt.close('all')
+  clear_cache(data)
+  data['seg'].cache.clear()
+  data['fig'], data['ax'] = plt.subplots(figsize = (5, 5), dpi = 100)
+
+def draw_segmentation(data, n):
+  data['seg'].plot(data['ax'], 'Axial', data['middle']['Axial'], data['ids'][:n], plot_legend = False)
+  data['fig'].canvas.draw()
+
+for n in [1, 10, 77]: stage(f'Segmentation.plot {n} structures', new_axis)(lambda data, n = n: draw_segmentation(data, n))
+
+def draw_raster(data, n):
+  data['seg'].plot(data['ax'], 'Axial', data['middle']['Axial'], data['ids'][:n], plot_legend = False, raster = True)
+  data['fig'].canvas.draw()
+
+for n in [10, 77]: stage(f'Segmentation.plot {n} structures raster', new_axis)(lambda data, n = n: draw_raster(data, n))
+
+def draw_image(data):
+  data['image'].plot('Axial', data['middle']['Axial'], data['ids'][:10], ax = data['ax'])
+  data['fig'].canvas.draw()
+
+stage('Image.plot', new_axis)(draw_image)
+
+def draw_grid(data):
+  data['image'].plot_buttloads_of_slices(5, 10, data['ids'][:10])
+  plt.gcf().canvas.draw()
+
+stage('Image.plot_buttloads_of_slices', new_axis)(draw_grid)
+
+# Database
+def remove_index(data):
+  index = index_path(data['kf'].values())
+  if os.path.isfile(index): os.remove(index)
+
+stage('Database index cold', remove_index)(lambda data: Database(kf = data['kf']))
+stage('Database index warm')(lambda data: Database(kf = data['kf']))
+
+def lookup(data):
+  database = Database(kf = data['kf'])
+  for id in database.files: database.index.search(id[:3] + id[-1])
+  return database(database.files[-1])
+
+stage('Database lookup')(lookup)
+
+# Volumetrics
+def subject_volumetrics(data):
+  database = Database(kf = data['kf'])
+  return [Subject(database.find_file(data['kf']['seg'], id)) for id in database.files]
+
+stage('Subject volumetrics')(subject_volumetrics)
+
+def run(data, repeats = 5, only = None):
+  results = dict()
+  for name, (function, setup) in stages.items():
+    if only is not None and not any(word in name for word in only): continue
+    # One untimed run first, so imports and first-use caches aren't counted
+    if setup is not None: setup(data)
+    function(data)
+    results[name] = measure(function, setup, data, repeats)
+    print(f'{name:<40} {results[name]["median_ms"]:>10.2f} ms')
+  close_figures(data)
+  return results
+
+def compare(results, baseline, threshold = 1.25, min_ms = 0.5):
+  # A stage has regressed if its median is more than threshold times the baseline's, and slower by more than timing noise
+  regressions = dict()
+  for name, result in results.items():
+    if name not in baseline: continue
+    ratio = result['median_ms'] / max(baseline[name]['median_ms'], 1e-9)
+    if ratio > threshold and result['median_ms'] - baseline[name]['median_ms'] > min_ms: regressions[name] = ratio
+  return regressions
+
+def main(args = None):
+  parser = argparse.ArgumentParser(description = 'Time the slicing, outline, drawing and database stages of ScanVis on synthetic data')
+  parser.add_argument('--data', default = os.path.join(tempfile.gettempdir(), 'scanvis_benchmark'), help = 'Folder for the synthetic data, reused between runs')
+  parser.add_argument('--size', type = int, default = 256, help = 'Side of the synthetic volumes')
+  parser.add_argument('--subjects', type = int, default = 20, help = 'Subjects in the synthetic database')
+  parser.add_argument('--subject-size', type = int, default = 64, help = 'Side of each database subject')
+  parser.add_argument('--repeats', type = int, default = 5)
+  parser.add_argument('--only', nargs = '*', default = None, help = 'Only run stages whose names contain one of these')
+  parser.add_argument('--out', default = None, help = 'Save the results to this JSON file')
+  parser.add_argument('--baseline', default = None, help = 'JSON results to compare against, regressions make the exit code 1')
+  parser.add_argument('--threshold', type = float, default = 1.25, help = 'How many times slower than the baseline counts as a regression')
+  parser.add_argument('--min-ms', type = float, default = 0.5, help = 'Stages less than this much slower than the baseline never count as regressions')
+  args = parser.parse_args(args)
+
+  data = prepare(os.path.join(args.data, f'{args.size}_{args.subjects}_{args.subject_size}'), (args.size,)*3, args.subjects, (args.subject_size,)*3)
+  report = {
+    'meta' : {'time' : strftime('%Y-%m-%dT%H:%M:%S'), 'python' : platform.python_version(), 'numpy' : np.__version__, 'matplotlib' : matplotlib.__version__, 'machine' : platform.platform(), 'size' : args.size, 'subjects' : args.subjects, 'subject_size' : args.subject_size},
+    'results' : run(data, args.repeats, args.only),
+  }
+  if args.baseline is not None:
+    with open(args.baseline, 'r') as file: baseline = json.load(file)['results']
+    report['regressions'] = compare(report['results'], baseline, args.threshold, args.min_ms)
+    for name, ratio in report['regressions'].items(): print(f'REGRESSION {name} is {ratio:.2f}x slower than the baseline')
+  if args.out is not None:
+    with open(args.out, 'w') as file: json.dump(report, file, indent = 2)
+  return 1 if report.get('regressions') else 0
+
+if __name__ == '__main__': sys.exit(main())
@@ -0,0 +1,55 @@
+import os
+import numpy as np
+import SimpleITK as sitk
+
+def synthetic_labels(shape = (256, 256, 256), n_labels = 77, seed = 0):
+  # A brain-shaped ellipsoid cut into shells and wedges, so every label is a solid, outlined structure like FreeSurfer's
+  rng = np.random.default_rng(seed)
+  z, y, x = [(np.arange(n) - n/2) / (0.4*n) for n in shape]
+  z, y, x = z[:, None, None], y[None, :, None], x[None, None, :]
+  r = np.sqrt(z**2 + y**2 + x**2)
+  angle = np.arctan2(y, x) + np.pi
+  shells, wedges = 7, -(-n_labels // 7)
+  parcel = np.minimum((r * shells).astype(np.int32), shells-1) * wedges + (angle / (2*np.pi) * wedges).astype(np.int32) % wedges
+  ids = rng.permutation(n_labels) + 1
+  labels = np.where(r < 1, ids[np.minimum(parcel, n_labels-1)], 0)
+  return labels.astype(np.uint8 if n_labels < 2**8 else np.uint16)
+
+def synthetic_scan(labels, seed = 0):
+  # Each label has its own brightness, with noise and a smooth bias field like a real T1
+  rng = np.random.default_rng(seed)
+  means = rng.uniform(50, 200, labels.max()+1).astype(np.float32)
+  means[0] = 0
+  z, y, x = [np.linspace(-1, 1, n, dtype = np.float32) for n in labels.shape]
+  bias = 1 + 0.1*z[:, None, None] + 0.1*y[None, :, None] - 0.05*x[None, None, :]
+  scan = means[labels] * bias
+  scan += rng.standard_normal(labels.shape, dtype = np.float32) * 5
+  return scan
+
+def save_volume(array, file):
+  if file[-4:] == '.npy': np.save(file, array)
+  else: sitk.WriteImage(sitk.GetImageFromArray(array), file)
+  return file
+
+def synthetic_volumes(folder, shape = (256, 256, 256), n_labels = 77, seed = 0):
+  # Writes one scan and its segmentation as both .nii and .npy, returning their paths
+  os.makedirs(folder, exist_ok = True)
+  files = {key + extension : os.path.join(folder, key + extension) for key in ['scan', 'seg'] for extension in ['.nii', '.npy']}
+  if all(os.path.isfile(file) for file in files.values()): return files
+  labels = synthetic_labels(shape, n_labels, seed)
+  scan = synthetic_scan(labels, seed)
+  for key, array in [('scan', scan), ('seg', labels)]:
+    for extension in ['.nii', '.npy']: save_volume(array, files[key + extension])
+  return files
+
+def synthetic_database(folder, subjects = 20, shape = (64, 64, 64), n_labels = 77, seed = 0):
+  # Scan and seg folders laid out like a real dataset, one subject per ID, returning the kf dictionary for Database
+  kf = {'scan' : os.path.join(folder, 'scan'), 'seg' : os.path.join(folder, 'seg')}
+  for path in kf.values(): os.makedirs(path, exist_ok = True)
+  for i in range(subjects):
+    id = f'S{i+1:04d}'
+    if os.path.isfile(os.path.join(kf['seg'], f'{id}.nii')): continue
+    labels = synthetic_labels(shape, n_labels, seed + i)
+    save_volume(synthetic_scan(labels, seed + i), os.path.join(kf['scan'], f'{id}.nii'))
+    save_volume(labels, os.path.join(kf['seg'], f'{id}.nii'))
+  return kf
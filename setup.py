@@ -7,6 +7,7 @@ setup(
     description="A library for visualising MRI scans",
     author="Tom Melichar",
     author_email="tbmelichar@gmail.com",
-    install_requires=['numpy', 'matplotlib', 'scipy', 'SimpleITK', 'ipywidgets', 'scikit.image', 'ants'],
+    install_requires=['numpy', 'matplotlib', 'scipy', 'SimpleITK', 'ipywidgets', 'pillow>=9.5', 'ants'],
     python_requires=">=3.6",
+    entry_points={'console_scripts': ['scanvis-export=ScanVis.export:main', 'scanvis-serve=ScanVis.server:main']},
 )
\ No newline at end of file
@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# Everything the tests cache goes in a folder of their own, and no lookup or patient table is found unless a test makes one
+os.environ['SCANVIS_CACHE'] = tempfile.mkdtemp(prefix = 'scanvis-tests-')
+os.environ['SCANVIS_LUT'] = os.environ['SCANVIS_PATIENTS'] = os.path.join(os.environ['SCANVIS_CACHE'], 'missing.txt')
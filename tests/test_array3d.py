@@ -0,0 +1,36 @@
+import numpy as np
+from skimage.transform import rotate
+from ScanVis.Array3D import *
+
+views = ['Saggittal', 'Axial', 'Coronal']
+
+def legacy_slice(array, view, slice):
+  # How slices were taken before views were rot90 reorientations, for a cube
+  n = array.shape[0]
+  if view == 'Saggittal': return rotate(array[:, :, n-1-slice], 270, preserve_range = True, order = 0)
+  elif view == 'Axial': return np.flip(array[:, slice, :])
+  return np.flip(array[slice, :, :], 1)
+
+def test_views_match_the_rotated_slices():
+  array = np.random.default_rng(7).integers(0, 60, (32, 32, 32)).astype(np.int32)
+  volume = Array3D(array)
+  for view in views:
+    for slice in [0, 5, 17, 31]: assert np.array_equal(volume.get_slice(view, slice), legacy_slice(array, view, slice))
+
+def scanned_extent(volume, view, test = np.any):
+  # First and last slice with anything in them, looking at every slice like the original get_slices
+  occupied = [slice for slice in range(volume.shape[volume.view_axis(view)]) if test(volume.get_slice(view, slice))]
+  return occupied[0], occupied[-1]
+
+def test_extents_match_scanning_every_slice():
+  from ScanVis.Segmentation import Segmentation
+  rng = np.random.default_rng(8)
+  for _ in range(5):
+    labels = np.zeros((24, 30, 36), np.uint8)
+    for label in [3, 17, 53]:
+      start = rng.integers(0, [20, 26, 32])
+      labels[tuple(slice(a, a + rng.integers(1, 5)) for a in start)] = label
+    seg = Segmentation(labels)
+    for view in views:
+      assert Array3D(labels).get_extent(view) == scanned_extent(seg, view)
+      for label in [3, 17, 53]: assert seg.get_extent(view, label) == scanned_extent(seg, view, lambda picture: np.any(picture == label))
@@ -0,0 +1,40 @@
+import os
+import numpy as np
+from ScanVis.Database import *
+
+def make_database(root, n = 4, shape = (16, 18, 20)):
+  # Scans that are bright outside the brain, so leaving the mask out changes the mean
+  rng = np.random.default_rng(4)
+  kf = {'scan' : os.path.join(root, 'scans'), 'seg' : os.path.join(root, 'segs')}
+  for folder in kf.values(): os.makedirs(folder)
+  scans, segs = [], []
+  for i in range(n):
+    labels = np.zeros(shape, np.uint8)
+    labels[3+i%2:12, 4:14, 5:15+i%3] = 17
+    labels[6:9, 7:10, 8:11] = 53
+    scan = rng.random(shape).astype(np.float32) + 5 * (labels == 0)
+    np.save(os.path.join(kf['scan'], f'S{i:04d}.npy'), scan)
+    np.save(os.path.join(kf['seg'], f'S{i:04d}.npy'), labels)
+    scans.append(scan)
+    segs.append(labels)
+  return Database(kf = kf), np.array(scans), np.array(segs)
+
+def test_brain_atlas_is_masked(tmp_path):
+  database, scans, segs = make_database(str(tmp_path))
+  scan, brain = database.atlas('scan'), database.atlas('brain')
+  masked = scans * (segs != 0)
+  assert not np.allclose(brain.mean, scan.mean)
+  assert np.allclose(scan.mean, scans.mean(0)) and np.allclose(scan.get_variance(), scans.var(0, ddof = 1))
+  assert np.allclose(brain.mean, masked.mean(0)) and np.allclose(brain.get_variance(), masked.var(0, ddof = 1))
+  assert np.allclose(brain.get_probability(17), (segs == 17).mean(0))
+  # No subject was built, let alone kept
+  assert all(subject is None for subject in database.values())
+
+def test_masked_images_are_added_masked(tmp_path):
+  database, scans, segs = make_database(str(tmp_path))
+  atlas = Atlas()
+  for id in database.files: atlas.add(database(id)['brain'])
+  assert np.allclose(atlas.mean, (scans * (segs != 0)).mean(0))
+  centred = Atlas()
+  for scan, seg in zip(scans, segs): centred.add(scan, seg, mask = True, centre = 2)
+  assert np.allclose(centred.mean, np.where(segs != 0, scans, 2).mean(0))
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from types import SimpleNamespace
+from ScanVis.Cohort import *
+
+def make_cohort(n = 60):
+  rng = np.random.default_rng(9)
+  ids = [f'S{i:04}' for i in range(n)]
+  volumetrics = SimpleNamespace(ids = ids, labels = np.array([0, 2, 17, 53]), volumes = rng.random((n, 4)) * 10)
+  # The last few subjects aren't in the patient table
+  patients = {id : [int(rng.integers(24, 200)), str(rng.choice(['F', 'M']))] for id in ids[:-5]}
+  cohort = Cohort.__new__(Cohort)
+  cohort.join(volumetrics, patients)
+  return cohort
+
+def test_filter_matches_numpy():
+  cohort = make_cohort()
+  years, volumes = cohort.age / 12, cohort.volumes
+  keep = (cohort.gender == 'F') & (years >= 8) & (years < 10)
+  assert 0 < keep.sum() < len(cohort)
+  assert np.array_equal(cohort.filter(gender = 'F', years = (8, 10)).ids, cohort.ids[keep])
+  assert np.array_equal(cohort.filter(gender = 'F', years = (8, 10))[17], volumes[keep, 2])
+  keep = np.isin(cohort.gender, ['M', 'U']) & (cohort.age >= 60) & (volumes[:, 3] < 5)
+  assert np.array_equal(cohort.filter(cohort[53] < 5, gender = ['M', 'U'], age = (60, None)).ids, cohort.ids[keep])
+  assert np.array_equal(cohort.filter(gender = 'U').ids, cohort.ids[-5:]) and np.all(cohort.filter(gender = 'U').age == -1)
+
+@pytest.mark.parametrize('aggregate', aggregates)
+def test_group_matches_numpy(aggregate):
+  cohort = make_cohort()
+  functions = {'mean' : np.mean, 'sum' : np.sum, 'count' : len, 'std' : lambda values: np.std(values, ddof = 1), 'min' : np.min, 'max' : np.max, 'median' : np.median}
+  volumes = cohort.volumes[:, 2].astype(np.float64)
+  groups, results = cohort.group('gender', 17, aggregate)
+  assert list(groups) == ['F', 'M', 'U']
+  assert np.allclose(results, [functions[aggregate](volumes[cohort.gender == group]) for group in groups])
+  # Bins are labelled by their lower edge, and subjects outside them are left out
+  bins = [4, 8, 12]
+  groups, results = cohort.group('years', 'total_volume', aggregate, bins)
+  years, total = cohort.age / 12, cohort.volumes[:, 1:].sum(1).astype(np.float64)
+  assert list(groups) == [4, 8]
+  assert np.allclose(results, [functions[aggregate](total[(years >= low) & (years < high)]) for low, high in zip(bins[:-1], bins[1:])])
+  assert np.isclose(cohort.aggregate(53, aggregate), functions[aggregate](cohort.volumes[:, 3].astype(np.float64)))
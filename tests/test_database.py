@@ -0,0 +1,90 @@
+import os
+import json
+import numpy as np
+from ScanVis.Database import *
+from ScanVis.Array3D import footprint
+from ScanVis.export import export
+
+def make_folders(root, n = 3, shape = (12, 14, 16)):
+  rng = np.random.default_rng(2)
+  kf = {'scan' : os.path.join(root, 'scans'), 'seg' : os.path.join(root, 'segs')}
+  for folder in kf.values(): os.makedirs(folder)
+  for i in range(n):
+    labels = np.zeros(shape, np.uint8)
+    labels[3:9, 4:10, 5:12] = 17
+    np.save(os.path.join(kf['scan'], f'S{i:04d}.npy'), rng.random(shape).astype(np.float32))
+    np.save(os.path.join(kf['seg'], f'S{i:04d}.npy'), labels)
+  return kf
+
+def test_index_is_saved_whole_and_not_relisted(tmp_path):
+  kf = make_folders(str(tmp_path))
+  mtimes = [os.stat(folder).st_mtime_ns for folder in kf.values()]
+  database = Database(kf = kf)
+  path = database.index.path
+  # Nothing is written to the data folders, and their mtimes are left alone
+  assert os.path.dirname(path) == os.path.join(cache_folder, 'indexes')
+  assert sorted(os.listdir(kf['scan'])) == ['S0000.npy', 'S0001.npy', 'S0002.npy']
+  assert [os.stat(folder).st_mtime_ns for folder in kf.values()] == mtimes
+  assert [file for file in os.listdir(os.path.dirname(path)) if file[-4:] == '.tmp'] == []
+  with open(path) as file: assert json.load(file) == database.index.entries
+  assert Database(kf = kf).index.refresh() == False
+  np.save(os.path.join(kf['scan'], 'S0003.npy'), np.zeros((12, 14, 16), np.float32))
+  np.save(os.path.join(kf['seg'], 'S0003.npy'), np.zeros((12, 14, 16), np.uint8))
+  assert Database(kf = kf).files == ['S0000', 'S0001', 'S0002', 'S0003']
+
+def test_each_set_of_folders_has_its_own_index(tmp_path):
+  kf = make_folders(str(tmp_path))
+  assert index_path(kf.values()) != index_path([kf['scan']]) == Database(kf = {'scan' : kf['scan']}).index.path
+
+def test_open_subject_matches_database(tmp_path):
+  kf = make_folders(str(tmp_path))
+  database = Database(kf = kf)
+  subject, files = database('S0001'), database.subject_files('S0001')
+  opened = open_subject(files, 'S0001')
+  assert type(opened) is type(subject) and list(opened.keys()) == list(subject.keys())
+  for key in subject.keys(): assert np.array_equal(opened[key].array, subject[key].array)
+
+def test_export_reads_no_index_in_workers(tmp_path):
+  kf = make_folders(str(tmp_path))
+  database = Database(kf = kf)
+  os.remove(database.index.path)
+  report = export(database, 'plot', {'view' : 'Axial', 'slice' : 6, 'structure_id' : [17]}, str(tmp_path / 'out'), 'scan', database.files + ['missing'], processes = 2)
+  assert [result['status'] for result in report] == ['done', 'done', 'done', "failed (missing is not in the Database)"]
+  assert all(os.path.isfile(result['file']) for result in report[:3])
+  # Only the main process's Database ever wrote the index, and it was removed before exporting
+  assert not os.path.isfile(database.index.path)
+
+def loaded(database): return [id for id in database.files if database.dictionary[id] is not None]
+
+def limited_database(kf, subjects):
+  # A memory limit that holds subjects and a half of these test subjects
+  size = footprint(Database(kf = kf, memory_limit = None).load('S0000').load().buffers())
+  return Database(kf = kf, memory_limit = int((subjects + 0.5) * size))
+
+def test_least_recently_used_subjects_are_evicted(tmp_path):
+  database = limited_database(make_folders(str(tmp_path), n = 4), 2)
+  for id in ['S0000', 'S0001', 'S0002']: database.load(id).load()
+  assert loaded(database) == ['S0000', 'S0001', 'S0002']
+  # Using S0000 again makes S0001 the least recently used
+  database.load('S0000')
+  database.load('S0003').load()
+  assert loaded(database) == ['S0000', 'S0002', 'S0003']
+  database.load('S0001').load()
+  assert loaded(database) == ['S0000', 'S0001', 'S0003']
+  assert list(database.recent) == ['S0000', 'S0003', 'S0001']
+  info = database.cache_info()
+  assert (info['hits'], info['misses'], info['evictions'], info['loaded']) == (1, 5, 2, 3)
+  assert info['bytes'] <= info['memory_limit'] + footprint(database.load('S0001').buffers())
+
+def test_pinned_subjects_are_kept_until_unpinned(tmp_path):
+  database = limited_database(make_folders(str(tmp_path), n = 4), 1)
+  database.pin('S0000')
+  database.load('S0000').load()
+  for id in ['S0001', 'S0002', 'S0003']: database.load(id).load()
+  assert loaded(database) == ['S0000', 'S0003'] and database.cache_info()['pinned'] == 1
+  database.load('S0001').load()
+  assert loaded(database) == ['S0000', 'S0001']
+  # Once unpinned, it's the least recently used and goes straight away
+  database.unpin('S0000')
+  assert loaded(database) == ['S0001'] and database.cache_info()['pinned'] == 0
+  assert database.cache_info()['evictions'] == 4
@@ -0,0 +1,41 @@
+import numpy as np
+from ScanVis.Image import *
+
+views = ['Saggittal', 'Axial', 'Coronal']
+
+def masked_image(centre = None):
+  rng = np.random.default_rng(1)
+  scan = rng.random((20, 24, 28)).astype(np.float32) + 1
+  labels = np.zeros(scan.shape, int)
+  labels[4:15, 6:18, 5:20] = 17
+  labels[8:12, 9:13, 10:14] = 53
+  return scan, labels, Image('brain', scan, Segmentation(labels), mask = True, centre = centre)
+
+def test_masked_array_matches_the_old_masked_copy():
+  for centre in [None, 0.5]:
+    scan, labels, image = masked_image(centre)
+    # Masking used to replace the array with this copy
+    old = scan * (labels != 0) + (0 if centre is None else centre) * (labels == 0)
+    assert np.allclose(image.masked_array(), old)
+    assert np.allclose(np.concatenate([image.masked_array(slice(start, start+3)) for start in range(0, scan.shape[0], 3)]), old)
+    # array is the unmasked scan, only the slices and masked_array are masked
+    assert np.array_equal(image.array, scan)
+    reference = Image('reference', old.astype(np.float32))
+    for view in views:
+      for index in [5, 10]: assert np.allclose(image.get_slice(view, index), reference.get_slice(view, index))
+
+def test_unmasked_array_is_the_scan():
+  scan, labels, _ = masked_image()
+  image = Image('scan', scan, Segmentation(labels))
+  assert image.masked_array() is not None and np.array_equal(image.masked_array(), scan)
+
+def test_static_plots_draw_full_resolution_unless_asked():
+  import matplotlib
+  matplotlib.use('Agg')
+  import matplotlib.pyplot as plt
+  image = Image('scan', np.random.default_rng(9).random((256, 256, 8)).astype(np.float32))
+  for level, shape in [(0, (256, 256)), ('auto', (128, 128)), (1, (128, 128))]:
+    fig, ax = plt.subplots(figsize = (1, 1), dpi = 100)
+    image.plot('Saggittal', 4, ax = ax, **({} if level == 0 else {'level' : level}))
+    assert ax.get_images()[0].get_array().shape == shape
+    plt.close(fig)
@@ -0,0 +1,43 @@
+import numpy as np
+from ScanVis.overlap import *
+
+def segmentations(shape = (20, 22, 24)):
+  first, second = np.zeros(shape, np.uint8), np.zeros(shape, np.uint8)
+  first[4:14, 5:15, 6:16], second[5:15, 5:16, 6:16] = 17, 17
+  first[8:11, 8:11, 8:11], second[8:12, 8:11, 9:12] = 53, 53
+  first[1:3, 1:3, 1:3] = 4
+  return first, second
+
+def test_overlap_against_brute_force():
+  first, second = segmentations()
+  spacing = (1.5, 1., 2.)
+  table = overlap_table(first, second, spacing = spacing)
+  assert list(table['label']) == [4, 17, 53]
+  for row in table:
+    a, b = first == row['label'], second == row['label']
+    # Volumes are in cm³
+    assert np.isclose(row['volume_first'], a.sum() * 3 / 1000) and np.isclose(row['volume_second'], b.sum() * 3 / 1000)
+    assert np.isclose(row['dice'], 2 * (a & b).sum() / (a.sum() + b.sum()))
+    assert np.isclose(row['jaccard'], (a & b).sum() / (a | b).sum())
+  assert np.isnan(table['hausdorff'][0]) and np.all(table['hausdorff'][1:] > 0)
+
+def test_background_is_never_a_label():
+  first, second = segmentations()
+  table = overlap_table(first, second, labels = [0, 53, 17, 300])
+  assert list(table['label']) == [53, 17]
+  expected = overlap_table(first, second, labels = [53, 17])
+  for name in table.dtype.names: assert np.array_equal(table[name], expected[name], equal_nan = True)
+
+def test_sparse_label_ids():
+  # aparc.a2009s style ids, where a matrix indexed by label would be 14176² voxels
+  first, second = segmentations()
+  first, second = [np.select([array == 17, array == 53, array == 4], [11101, 14175, 12000]).astype(np.int32) for array in [first, second]]
+  matrix, labels = confusion_matrix(first, second)
+  assert list(labels) == [0, 11101, 12000, 14175] and matrix.shape == (4, 4)
+  for i, a in enumerate(labels):
+    for j, b in enumerate(labels): assert matrix[i, j] == np.sum((first == a) & (second == b))
+  table = overlap_table(first, second, labels = [14175, 11101, 12000, 13000])
+  assert list(table['label']) == [14175, 11101, 12000]
+  # The same overlaps as the small ids they stand for
+  expected = overlap_table(*segmentations(), labels = [53, 17, 4])
+  for name in table.dtype.names[1:]: assert np.array_equal(table[name], expected[name], equal_nan = True)
@@ -0,0 +1,77 @@
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from ScanVis.Image import *
+
+def thin_structure(thickness):
+  # Label 17 spans Axial slices 30 to 30 + thickness - 1, inside a bigger label 2
+  labels = np.zeros((48, 64, 40), np.uint8)
+  labels[5:40, 5:60, 5:35] = 2
+  labels[10:20, 30:30+thickness, 12:22] = 17
+  return Segmentation(labels)
+
+def test_focused_slices_stay_inside_the_structure():
+  seg = thin_structure(6)
+  assert seg.get_extent('Axial', 17) == (30, 35)
+  for buffer in [[10, 10], [2, 2], [0, 0], [-5, 3]]:
+    slices = seg.get_slices('Axial', 5, buffer, 17)
+    assert np.all(np.diff(slices) > 0) and slices[0] >= 30 and slices[-1] <= 35 and len(slices) == 5
+  assert list(thin_structure(3).get_slices('Axial', 5, [10, 10], 17)) == [30, 31, 32]
+  # Without focus the whole segmentation's extent and buffer are used as before
+  assert list(seg.get_slices('Axial', 3, [10, 10])) == [15, 32, 49]
+
+def test_plot_hella_slices_with_focus_shows_different_slices():
+  seg = thin_structure(6)
+  image = Image('scan', np.random.default_rng(5).random(seg.shape).astype(np.float32), seg)
+  fig, ax = plt.subplots(1, 5)
+  image.plot_hella_slices('Axial', 5, 10, [17], ax = ax, focus = 17, level = 0)
+  shown = [int(a.get_xlabel().split()[1]) for a in ax]
+  assert shown == sorted(set(shown)) and len(shown) == 5 and 30 <= shown[0] and shown[-1] <= 35
+  plt.close(fig)
+
+def separate_structures():
+  # Label 17 is in Axial slices 10 to 14 and label 53 in 40 to 44, with nothing of either in between
+  labels = np.zeros((48, 64, 40), np.uint8)
+  labels[10:20, 10:15, 12:22] = 17
+  labels[10:20, 40:45, 12:22] = 53
+  return Segmentation(labels)
+
+def test_focused_slices_of_separate_structures_are_in_them():
+  seg = separate_structures()
+  for slices in [2, 4, 5, 10, 20]:
+    chosen = seg.get_slices('Axial', slices, [10, 10], [17, 53])
+    assert len(chosen) == min(slices, 10) and np.all(np.diff(chosen) > 0)
+    assert all(10 <= s <= 14 or 40 <= s <= 44 for s in chosen)
+  assert list(seg.get_slices('Axial', 4, [0, 0], [17, 53])) == [10, 13, 41, 44]
+
+def test_plot_hella_slices_titles_the_slices_drawn():
+  seg = separate_structures()
+  image = Image('scan', np.random.default_rng(5).random(seg.shape).astype(np.float32), seg)
+  fig, ax = plt.subplots(1, 5)
+  image.plot_hella_slices('Axial', 5, 10, [17, 53], ax = ax, focus = [17, 53], level = 0)
+  shown = [int(a.get_xlabel().split()[1]) for a in ax]
+  assert shown == sorted(set(shown)) and all(10 <= s <= 14 or 40 <= s <= 44 for s in shown)
+  # Slices given without the structures in them are moved before they're titled, and never shown twice
+  image.plot_hella_slices('Axial', [25, 41, 30], 10, [17, 53], ax = ax, focus = [17, 53], level = 0)
+  largest = seg.focus_slice('Axial', [17, 53])
+  assert [a.get_xlabel() for a in ax[:2]] == [f'Slice {largest}', 'Slice 41'] and not ax[2].get_visible()
+  # A title given for a slice keeps that slice, zoomed in on the structures
+  fig2, single = plt.subplots()
+  image.plot('Axial', 25, title = 'Slice 25', ax = single, focus = 17)
+  assert single.get_xlabel() == 'Slice 25'
+  assert np.array_equal(single.get_images()[0].get_array(), image.get_slice('Axial', 25, 0, seg.get_box('Axial', 17)))
+  plt.close(fig)
+  plt.close(fig2)
+
+def test_histogram_matches_counting_each_slice():
+  labels = np.random.default_rng(11).choice(np.array([0, 2, 17, 41, 53], np.uint8), (18, 22, 26), p = [0.6, 0.1, 0.1, 0.1, 0.1])
+  seg = Segmentation(labels)
+  for view in ['Saggittal', 'Axial', 'Coronal']:
+    histogram = seg.get_histogram(view)
+    assert histogram.shape == (labels.shape[seg.view_axis(view)], 54)
+    for slice in range(len(histogram)):
+      values, counts = np.unique(seg.get_slice(view, slice), return_counts = True)
+      expected = np.zeros(54, int)
+      expected[values] = counts
+      assert np.array_equal(histogram[slice], expected)
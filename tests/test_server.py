@@ -0,0 +1,92 @@
+import os
+import json
+import threading
+import numpy as np
+from io import BytesIO
+from PIL import Image as PIL_Image
+from urllib.request import urlopen
+from urllib.error import HTTPError
+from ScanVis.server import *
+
+def make_database(root, shape = (12, 16, 20)):
+  kf = {'scan' : os.path.join(root, 'scans'), 'seg' : os.path.join(root, 'segs')}
+  for folder in kf.values(): os.makedirs(folder)
+  labels = np.zeros(shape, np.uint8)
+  labels[3:9, 4:12, 5:15] = 17
+  np.save(os.path.join(kf['scan'], 'S0000.npy'), np.random.default_rng(6).random(shape).astype(np.float32))
+  np.save(os.path.join(kf['seg'], 'S0000.npy'), labels)
+  return Database(kf = kf)
+
+def start(database, folder):
+  server = TileServer(database, ('127.0.0.1', 0), TileCache(folder))
+  threading.Thread(target = server.serve_forever, daemon = True).start()
+  return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+def get(url):
+  try:
+    with urlopen(url) as response: return response.status, response.read()
+  except HTTPError as error: return error.code, error.read()
+
+def test_cached_tiles_need_no_subject(tmp_path):
+  database, folder = make_database(str(tmp_path)), str(tmp_path / 'tiles')
+  server, url = start(database, folder)
+  status, png = get(url + '/tiles/S0000/scan/Axial/6.png?structures=17')
+  assert status == 200 and png[:8] == b'\x89PNG\r\n\x1a\n'
+  assert get(url + '/tiles/S0000/scan/Axial/6.png?structures=17') == (200, png)
+  assert database.cache_info()['misses'] == 1
+  server.shutdown()
+  server.server_close()
+  # After a restart the tile comes off the disk without loading the subject again
+  database = Database(kf = database.kf)
+  server, url = start(database, folder)
+  assert get(url + '/tiles/S0000/scan/Axial/6.png?structures=17') == (200, png)
+  assert server.cache.disk_hits == 1 and database.cache_info()['misses'] == 0 and database.dictionary['S0000'] is None
+  # Bounds come from the file's header
+  assert get(url + '/tiles/S0000/scan/Axial/16.png')[0] == 404 and database.dictionary['S0000'] is None
+  assert get(url + '/tiles/S0000/brain/Coronal/11.png')[0] == 200
+  server.shutdown()
+  server.server_close()
+
+def test_focus_on_a_missing_structure(tmp_path):
+  server, url = start(make_database(str(tmp_path)), None)
+  assert get(url + '/tiles/S0000/scan/Axial/6.png?focus=17')[0] == 200
+  status, body = get(url + '/tiles/S0000/scan/Axial/6.png?focus=99')
+  assert status == 404 and 'not in S0000' in json.loads(body)['error']
+  assert get(url + '/tiles/S0000/scan/Axial/6.png?focus=x')[0] == 400
+  server.shutdown()
+  server.server_close()
+
+def test_rewritten_tiles_are_counted_once(tmp_path):
+  cache = TileCache(str(tmp_path))
+  for data in [b'a' * 100, b'b' * 60, b'c' * 60]: cache.put('tile', data)
+  assert cache.disk_used == 60 == sum(os.path.getsize(tmp_path / file) for file in os.listdir(tmp_path))
+
+def test_levels_are_checked(tmp_path):
+  server, url = start(make_database(str(tmp_path)), None)
+  # The shortest axis is 12 voxels, so level 3 is the coarsest
+  assert get(url + '/tiles/S0000/scan/Axial/6.png?level=3')[0] == 200
+  for level in ['-1', '4', '1.5', 'x', '%C2%B2']:
+    status, body = get(url + f'/tiles/S0000/scan/Axial/6.png?level={level}')
+    assert status == 400 and 'from 0 to 3' in json.loads(body)['error']
+  server.shutdown()
+  server.server_close()
+
+def test_info_reads_only_the_segmentation(tmp_path):
+  database = make_database(str(tmp_path))
+  server, url = start(database, None)
+  status, body = get(url + '/subjects/S0000')
+  info = json.loads(body)
+  assert status == 200 and info['shape'] == [12, 16, 20] and info['slices'] == {'Saggittal' : 20, 'Axial' : 16, 'Coronal' : 12}
+  assert info['keys'] == ['scan', 'brain', 'seg'] and info['labels'] == {'17' : '17'}
+  subject = database.dictionary['S0000']
+  assert subject['scan']._array is None and subject['scan'].seg._array is not None
+  server.shutdown()
+  server.server_close()
+
+def test_tiles_are_the_rendered_slice(tmp_path):
+  database = make_database(str(tmp_path))
+  server, url = start(database, None)
+  status, png = get(url + '/tiles/S0000/seg/Coronal/5.png?structures=17&level=1')
+  with PIL_Image.open(BytesIO(png)) as tile: assert tile.mode == 'RGBA' and np.array_equal(np.asarray(tile), database.load('S0000')['seg'].render_slice('Coronal', 5, [17], None, colors, 0.2, 1, False, 1, 'k'))
+  server.shutdown()
+  server.server_close()
@@ -0,0 +1,27 @@
+import os
+import numpy as np
+import pytest
+from PIL import Image as PIL_Image
+from ScanVis.sweep import *
+
+def frames(n = 12):
+  rng = np.random.default_rng(3)
+  for i in range(n):
+    frame = np.zeros((40, 30, 4), np.uint8)
+    frame[..., 3] = 255
+    frame[5:5+2*i, 3:25, :3] = rng.integers(0, 256, 3)
+    yield frame
+
+def test_write_gif(tmp_path):
+  file = str(tmp_path / 'sweep.gif')
+  assert write_gif(frames(), file, fps = 5) == 12
+  with PIL_Image.open(file) as gif:
+    assert gif.n_frames == 12 and gif.info['duration'] == 200 and gif.info['loop'] == 0
+    for i, frame in enumerate(frames()):
+      gif.seek(i)
+      assert np.abs(np.asarray(gif.convert('RGB'), int) - frame[..., :3]).max() <= 8
+
+def test_write_gif_without_frames(tmp_path):
+  file = str(tmp_path / 'empty.gif')
+  with pytest.raises(Exception, match = 'No frames'): write_gif(iter([]), file)
+  assert not os.path.exists(file)
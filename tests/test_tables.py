@@ -0,0 +1,40 @@
+import os
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from ScanVis.Image import *
+
+def labelled_image():
+  labels = np.zeros((20, 24, 28), np.uint8)
+  labels[4:15, 6:18, 5:20] = 17
+  labels[8:12, 9:13, 10:14] = 53
+  return Image('scan', np.random.default_rng(10).random(labels.shape).astype(np.float32), Segmentation(labels))
+
+def legend(ax): return [text.get_text() for text in ax.get_legend().get_texts()]
+
+def test_drawing_without_a_lookup_table(capsys):
+  set_lut_file(os.path.join(os.environ['SCANVIS_CACHE'], 'no_lut.txt'))
+  image = labelled_image()
+  fig, ax = plt.subplots()
+  image.plot('Axial', 10, [17, 53], c = ['r', 'b'], ax = ax)
+  assert legend(ax) == ['17', '53']
+  fig, ax = plt.subplots(1, 2)
+  image.overlay('Axial', 10, [17, 53], c = ['r', 'b'], ax = ax)
+  assert legend(ax[1]) == ['17', '53']
+  fig, ax = plt.subplots()
+  image.plot('Axial', 10, ax = ax, focus = 53)
+  assert legend(ax) == ['53']
+  assert image.seg.get_label_names()[17] == '17'
+  assert 'Warning : ' in capsys.readouterr().out and len(lut) == 0
+  plt.close('all')
+
+def test_drawing_with_a_lookup_table(tmp_path):
+  file = str(tmp_path / 'LUT.txt')
+  with open(file, 'w') as f: f.write('#No. Label Name\n17  Left-Hippocampus  220 216 20 0\n53  Right-Hippocampus  220 216 20 0\n')
+  set_lut_file(file)
+  fig, ax = plt.subplots()
+  labelled_image().plot('Axial', 10, [17, 53, 4], c = ['r', 'b', 'g'], ax = ax)
+  assert legend(ax) == ['Left-Hippocampus', 'Right-Hippocampus', '4'] and rlut['Right-Hippocampus'] == 53
+  set_lut_file(os.environ['SCANVIS_LUT'])
+  plt.close('all')
@@ -0,0 +1,59 @@
+import os
+import numpy as np
+import pytest
+import SimpleITK as sitk
+from ScanVis.volumes import *
+
+@pytest.fixture
+def cache(tmp_path):
+  folder = enable_volume_cache(str(tmp_path / 'volumes'), max_bytes = 2**30)
+  yield folder
+  disable_volume_cache()
+
+def write_nifti(path, array, spacing = (1., 2., 3.)):
+  image = sitk.GetImageFromArray(array)
+  image.SetSpacing(spacing)
+  sitk.WriteImage(image, str(path))
+  return str(path)
+
+def entries(folder): return sorted(os.listdir(folder))
+
+def test_cache_hit_is_a_memmap_of_the_source(cache, tmp_path):
+  source = np.random.default_rng(0).integers(0, 1000, (6, 7, 8)).astype(np.int16)
+  path = write_nifti(tmp_path / 'scan.nii.gz', source)
+  array, info = read_volume(path)
+  assert not isinstance(array, np.memmap)
+  entry = cached_volume(path)
+  assert entries(cache) == [os.path.basename(entry) + '.json', os.path.basename(entry) + '.npy']
+  cached, cached_info = read_volume(path)
+  assert isinstance(cached, np.memmap) and cached.dtype == source.dtype
+  assert np.array_equal(cached, source)
+  assert tuple(cached_info['spacing']) == tuple(info['spacing']) == (1., 2., 3.)
+  assert cached_info['source'] == os.path.abspath(path)
+
+def test_key_changes_with_mtime_and_size(cache, tmp_path):
+  path = write_nifti(tmp_path / 'scan.nii', np.zeros((4, 5, 6), np.int16))
+  first = cached_volume(path)
+  stat = os.stat(path)
+  os.utime(path, ns = (stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+  touched = cached_volume(path)
+  assert volume_key(path)[2] == stat.st_size and touched != first
+  write_nifti(path, np.zeros((4, 5, 7), np.int16))
+  os.utime(path, ns = (stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+  assert volume_key(path)[1:] == (stat.st_mtime_ns + 10**9, stat.st_size + 4 * 5 * 2)
+  assert cached_volume(path) not in [first, touched]
+
+def test_trimming_removes_the_least_recently_used_pairs(cache, tmp_path):
+  paths = [write_nifti(tmp_path / f'scan{i}.nii', np.full((8, 8, 8), i, np.int16)) for i in range(3)]
+  for path in paths: read_volume(path)
+  names = [os.path.basename(cached_volume(path)) for path in paths]
+  # Last used in order 1, 0, 2 - reading a cached volume counts as using it
+  for age, name in zip([2, 3, 1], names): os.utime(os.path.join(cache, name + '.json'), ns = (0, 10**18 - age * 10**9))
+  size = os.path.getsize(os.path.join(cache, names[0] + '.npy'))
+  trim_volume_cache(max_bytes = 2 * size)
+  assert entries(cache) == sorted([names[0] + '.json', names[0] + '.npy', names[2] + '.json', names[2] + '.npy'])
+  read_cached_volume(os.path.join(cache, names[0]))
+  trim_volume_cache(max_bytes = size)
+  assert entries(cache) == [names[0] + '.json', names[0] + '.npy']
+  trim_volume_cache(max_bytes = 0)
+  assert entries(cache) == []